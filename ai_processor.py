@@ -1,8 +1,142 @@
+import asyncio
+import functools
+import itertools
+import os
+import random
+import re
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 import ollama
+import tenacity
+
+from llm_cache import llm_cache
+from scoring import heuristics_engagement_scores
+from tracing import Span, bind, current_span_id, finish_span, span
 
 # The model name must match the one you downloaded with 'ollama pull'
 MODEL = 'gemma:2b'
 
+# Every request goes through one shared client (and one async client per event loop), so HTTP connections are reused.
+# OLLAMA_HOST defaults to the ollama package's own default, http://127.0.0.1:11434.
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST") or None
+OLLAMA_TIMEOUT_S = float(os.environ.get("OLLAMA_TIMEOUT_S", "300"))
+# Ollama unloads an idle model after 5 minutes by default, so the next request pays the full load again.
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Changing num_ctx makes Ollama reload the model, so every request (and the warm-up) sends the same options.
+OLLAMA_OPTIONS = {option: int(os.environ[env]) for option, env in (("num_ctx", "OLLAMA_NUM_CTX"), ("num_thread", "OLLAMA_NUM_THREAD")) if os.environ.get(env)}
+# Retries after the first attempt, so a request is sent at most OLLAMA_RETRIES + 1 times.
+OLLAMA_RETRIES = int(os.environ.get("OLLAMA_RETRIES", "2"))
+
+# Subtitle translation packs many segments into one prompt; this bounds the prompt size per call.
+TRANSLATION_BATCH_TOKENS = int(os.environ.get("TRANSLATION_BATCH_TOKENS", "1024"))
+TRANSLATION_MEMORY_SIZE = int(os.environ.get("TRANSLATION_MEMORY_SIZE", "20000"))
+_translation_memory = OrderedDict()
+_translation_memory_lock = threading.Lock()
+_NUMBERED_LINE = re.compile(r"^\s*\[?(\d+)[\]\.\):]\s*(.*)$")
+
+# Upper bound on generations sent to Ollama at once by the async fan-out helpers.
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "4"))
+_async_clients = weakref.WeakKeyDictionary()
+
+# Bump a template's version whenever its prompt changes so stale cached responses are not served.
+PROMPT_VERSIONS = {"summarize": 1, "summarize_chunk": 1, "summarize_reduce": 1, "post": 1, "translate": 1, "translate_batch": 1, "upgrade": 1}
+
+# Best-of-N rewrites: variants are sampled across this temperature range, each with its own seed, so they actually differ.
+POST_VARIANTS = int(os.environ.get("POST_VARIANTS", "4"))
+VARIANT_TEMPERATURES = (0.6, 1.2)
+
+# Texts longer than one chunk are summarized chunk by chunk (map) and the partial summaries merged (reduce).
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "1500"))
+SUMMARY_MIN_CHUNK_TOKENS = SUMMARY_CHUNK_TOKENS // 4
+# On average every Nth sentence (by content hash) past the minimum size ends a chunk.
+SUMMARY_BOUNDARY_EVERY = 12
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?。！？])\s+|\n\s*\n")
+
+class OllamaError(Exception):
+    """Ollama could not produce a response, even after retrying. The message is fit to show to the user."""
+
+class OllamaUnavailableError(OllamaError):
+    """The Ollama server could not be reached or did not answer in time."""
+
+class OllamaResponseError(OllamaError):
+    """Ollama answered with an error, e.g. the model has not been pulled."""
+
+# Exceptions raised by the ollama package and httpx for a failed request.
+_OLLAMA_FAILURES = (ollama.ResponseError, ConnectionError, httpx.HTTPError)
+
+def _ollama_error(e):
+    if isinstance(e, ollama.ResponseError):
+        return OllamaResponseError(f"Ollama returned an error ({e.status_code}): {e.error}")
+    if isinstance(e, httpx.TimeoutException):
+        return OllamaUnavailableError(f"The local Ollama server did not answer within {OLLAMA_TIMEOUT_S:.0f}s.")
+    if isinstance(e, (ConnectionError, httpx.TransportError)):
+        return OllamaUnavailableError("Could not connect to the local Ollama server. Please ensure the Ollama application is running.")
+    return OllamaError(f"Ollama request failed: {e}")
+
+def _is_transient(e):
+    # Overload, restarts and dropped connections are worth another try; a missing model or bad request is not.
+    if isinstance(e, ollama.ResponseError): return e.status_code in (408, 429) or e.status_code >= 500
+    # A generation that ran into the read timeout would likely do so again, multiplying the wait; only connecting is retried.
+    if isinstance(e, httpx.TimeoutException): return isinstance(e, (httpx.ConnectTimeout, httpx.PoolTimeout))
+    return isinstance(e, (ConnectionError, httpx.TransportError))
+
+def _log_retry(retry_state):
+    print(f"WARNING: Ollama request failed ({retry_state.outcome.exception()!r}); retry {retry_state.attempt_number} of {OLLAMA_RETRIES}")
+
+_retry = tenacity.retry(stop=tenacity.stop_after_attempt(OLLAMA_RETRIES + 1), wait=tenacity.wait_exponential_jitter(initial=0.5, max=8, jitter=0.5),
+                        retry=tenacity.retry_if_exception(_is_transient), before_sleep=_log_retry, reraise=True)
+
+@functools.lru_cache(maxsize=1)
+def _client():
+    return ollama.Client(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT_S)
+
+def _request(prompt, options=None):
+    return {"model": MODEL, "prompt": prompt, "keep_alive": OLLAMA_KEEP_ALIVE, "options": {**OLLAMA_OPTIONS, **(options or {})} or None}
+
+@_retry
+def _call(prompt):
+    return _client().generate(**_request(prompt))
+
+def warm_up(background=True):
+    """Loads MODEL into Ollama's memory ahead of the first request; a generate call with an empty prompt only loads the model."""
+    def _load():
+        try:
+            _call("")
+        except _OLLAMA_FAILURES as e:
+            print(f"WARNING: Could not warm up Ollama model '{MODEL}': {_ollama_error(e)}")
+    if not background:
+        _load(); return None
+    thread = threading.Thread(target=_load, name="ollama-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _record_ollama_metrics(ollama_span, response):
+    """Copies Ollama's token counts and its load/prompt/eval timings (reported in ns) onto the span."""
+    ollama_span.set(prompt_eval_count=response.get("prompt_eval_count"), eval_count=response.get("eval_count"),
+                    **{f"{k}_s": response.get(k) / 1e9 for k in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration") if response.get(k) is not None})
+
+def _generate(prompt, template, use_cache=True):
+    """Returns the model's raw response text, served from the response cache when possible."""
+    with span("ollama.generate", template=template, model=MODEL) as ollama_span:
+        key = llm_cache.make_key(MODEL, template, PROMPT_VERSIONS[template], prompt)
+        if use_cache:
+            cached = llm_cache.get(key)
+            ollama_span.set(cache_hit=cached is not None)
+            if cached is not None: return cached
+        try:
+            response = _call(prompt)
+        except _OLLAMA_FAILURES as e:
+            raise _ollama_error(e) from e
+        _record_ollama_metrics(ollama_span, response)
+        # A bypassed lookup still refreshes the entry, so the regenerated text is what later calls reuse.
+        if response['response'].strip(): llm_cache.put(key, response['response'])
+        return response['response']
+
 def get_improvement_tips(tone):
     """Helper function to get context-specific improvement tips."""
     if "Professional" in tone or "Formal" in tone or "Informative" in tone:
@@ -15,20 +149,11 @@ def get_improvement_tips(tone):
         tips = ["- Make the language more conversational, as if talking to a friend.", "- Add 2-3 relevant emojis to show personality.", "- Include 2–3 relevant hashtags to increase reach."]
     return tips
 
-def summarize_text(text_to_summarize):
-    """Generates a summary using the local Ollama model."""
-    try:
-        prompt = f"Summarize the following text in a concise paragraph, focusing on the key points. Do not add any preamble or introductory phrases like 'Here is a summary'. Just provide the summary directly:\n\n{text_to_summarize}"
-        response = ollama.generate(model=MODEL, prompt=prompt)
-        return response['response'].strip()
-    except Exception as e:
-        if "connection refused" in str(e).lower(): return "Error: Could not connect to the local Ollama server. Please ensure the Ollama application is running."
-        return f"Error during summarization: {e}"
+def _summary_prompt(text_to_summarize):
+    return f"Summarize the following text in a concise paragraph, focusing on the key points. Do not add any preamble or introductory phrases like 'Here is a summary'. Just provide the summary directly:\n\n{text_to_summarize}"
 
-def generate_platform_post(summary, platform, tone):
-    """Generates a social media post using the local Ollama model."""
-    try:
-        prompt = f"""
+def _post_prompt(summary, platform, tone):
+    return f"""
         You are an expert social media manager creating a post for {platform}. Your tone must be strictly '{tone}'.
         Generate a ready-to-paste post based on this summary: "{summary}".
         IMPORTANT RULES:
@@ -38,28 +163,13 @@ def generate_platform_post(summary, platform, tone):
         4. Start the response directly with the title or the first line of the post content.
         5. At the very end of the post, include a line with 3 to 5 relevant hashtags (e.g., #studytips #careerchange #tech).
         """
-        response = ollama.generate(model=MODEL, prompt=prompt)
-        clean_response = response['response'].strip().replace("**", "")
-        return clean_response
-    except Exception as e:
-        if "connection refused" in str(e).lower(): return "Error: Could not connect to the local Ollama server."
-        return f"An error occurred while generating the post: {e}"
 
-def translate_text(text, target_language):
-    """Translates text to the target language using the local Ollama model."""
-    try:
-        prompt = f"Translate the following text into {target_language}. Provide only the translated text, with no extra commentary or labels:\n\n{text}"
-        response = ollama.generate(model=MODEL, prompt=prompt)
-        return response['response'].strip()
-    except Exception as e:
-        if "connection refused" in str(e).lower(): return "Error: Could not connect to the local Ollama server."
-        return f"Error: Could not translate text: {e}"
+def _translate_prompt(text, target_language):
+    return f"Translate the following text into {target_language}. Provide only the translated text, with no extra commentary or labels:\n\n{text}"
 
-def auto_upgrade_post(post_text, platform, tone, language): # NEW: Added 'language' argument
-    """Improves a social media post using the local Ollama model based on specific scoring rules."""
-    try:
-        # --- UPDATED: New, rule-based prompt for the auto-upgrader ---
-        prompt = f"""
+def _upgrade_prompt(post_text, platform, tone, language):
+    # --- UPDATED: New, rule-based prompt for the auto-upgrader ---
+    return f"""
         You are an expert social media manager. Rewrite and improve the following post for {platform} to **maximize its engagement score**, while keeping the original core message.
 
         Original Post:
@@ -75,10 +185,318 @@ def auto_upgrade_post(post_text, platform, tone, language): # NEW: Added 'langua
 
         Improved Post (plain text only, no commentary, ready to be copy-pasted):
         """
-        
-        response = ollama.generate(model=MODEL, prompt=prompt)
-        improved_text = response['response'].strip().replace("**", "")
-        return improved_text
+
+# --- Token-aware chunking and map-reduce summarization for long texts ---
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    # cl100k is not gemma's tokenizer, but it is close enough to size prompts.
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None: return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _split_long_sentence(sentence, max_tokens):
+    pieces, current, used = [], [], 0
+    for word in sentence.split():
+        n = count_tokens(word) + 1
+        if current and used + n > max_tokens:
+            pieces.append(" ".join(current)); current, used = [], 0
+        current.append(word); used += n
+    if current: pieces.append(" ".join(current))
+    return pieces
+
+def split_into_chunks(text, max_tokens=SUMMARY_CHUNK_TOKENS, min_tokens=SUMMARY_MIN_CHUNK_TOKENS):
+    """Splits text at sentence ends into chunks of at most max_tokens.
+    Boundaries depend on sentence content rather than position, so editing one passage
+    changes only the chunks around it and the rest still hit the response cache."""
+    chunks, current, used = [], [], 0
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence: continue
+        n = count_tokens(sentence)
+        for piece in (_split_long_sentence(sentence, max_tokens) if n > max_tokens else [sentence]):
+            n = count_tokens(piece) if piece is not sentence else n
+            if current and used + n > max_tokens:
+                chunks.append(" ".join(current)); current, used = [], 0
+            current.append(piece); used += n
+            if used >= min_tokens and zlib.crc32(piece.encode("utf-8")) % SUMMARY_BOUNDARY_EVERY == 0:
+                chunks.append(" ".join(current)); current, used = [], 0
+    if current: chunks.append(" ".join(current))
+    return chunks
+
+def _chunk_summary_prompt(chunk):
+    return f"Summarize the following passage from a longer text in a few sentences, keeping the key points, names and numbers. Do not add any preamble or introductory phrases. Just provide the summary directly:\n\n{chunk}"
+
+def _reduce_prompt(partial_summaries):
+    return f"The following are summaries of consecutive parts of one text. Combine them into a single concise paragraph covering the key points of the whole text. Do not add any preamble or introductory phrases like 'Here is a summary'. Just provide the summary directly:\n\n{partial_summaries}"
+
+def _summarize_chunks(chunks, use_cache=True):
+    with ThreadPoolExecutor(max_workers=max(1, min(OLLAMA_MAX_CONCURRENCY, len(chunks)))) as pool:
+        return list(pool.map(bind(lambda chunk: _generate(_chunk_summary_prompt(chunk), "summarize_chunk", use_cache).strip()), chunks))
+
+def _final_summary_prompt(text_to_summarize, use_cache=True):
+    """Runs the map (and any intermediate reduce) rounds; returns the prompt and template for the last call."""
+    if count_tokens(text_to_summarize) <= SUMMARY_CHUNK_TOKENS:
+        return _summary_prompt(text_to_summarize), "summarize"
+    parts = split_into_chunks(text_to_summarize)
+    while True:
+        partials = _summarize_chunks(parts, use_cache)
+        combined = "\n\n".join(partials)
+        groups = ["\n\n".join(group) for group in _pack_batches(partials, SUMMARY_CHUNK_TOKENS)]
+        # Stop once the partials fit one prompt, or when grouping can no longer shrink them.
+        if len(groups) == 1 or len(groups) >= len(partials):
+            return _reduce_prompt(combined), "summarize_reduce"
+        parts = groups
+
+# The generation functions below raise OllamaError when Ollama fails, so error text never ends up in a post or the cache.
+
+def summarize_text(text_to_summarize, use_cache=True):
+    """Generates a summary using the local Ollama model."""
+    prompt, template = _final_summary_prompt(text_to_summarize, use_cache)
+    return _generate(prompt, template, use_cache).strip()
+
+def generate_platform_post(summary, platform, tone, use_cache=True):
+    """Generates a social media post using the local Ollama model."""
+    response = _generate(_post_prompt(summary, platform, tone), "post", use_cache)
+    return response.strip().replace("**", "")
+
+def translate_text(text, target_language, use_cache=True):
+    """Translates text to the target language using the local Ollama model."""
+    return _generate(_translate_prompt(text, target_language), "translate", use_cache).strip()
+
+def auto_upgrade_post(post_text, platform, tone, language, use_cache=True): # NEW: Added 'language' argument
+    """Improves a social media post using the local Ollama model based on specific scoring rules."""
+    response = _generate(_upgrade_prompt(post_text, platform, tone, language), "upgrade", use_cache)
+    return response.strip().replace("**", "")
+
+# --- Streaming variants, yielding text as the model produces it ---
+
+@_retry
+def _open_stream(prompt):
+    """Starts a streamed generation and waits for its first chunk, so only failures before any output are retried."""
+    stream = _client().generate(**_request(prompt), stream=True)
+    try:
+        return next(stream, None), stream
+    except BaseException:
+        stream.close(); raise
+
+def _generate_stream(prompt, template, use_cache=True):
+    """Yields response chunks as they arrive; the full response is cached only if the stream runs to completion."""
+    # A span context manager would stay "current" in the consumer while we are suspended at a yield, so finish it by hand.
+    ollama_span = Span("ollama.generate", current_span_id(), {"template": template, "model": MODEL, "stream": True})
+    key = llm_cache.make_key(MODEL, template, PROMPT_VERSIONS[template], prompt)
+    if use_cache:
+        cached = llm_cache.get(key)
+        ollama_span.set(cache_hit=cached is not None)
+        if cached is not None:
+            finish_span(ollama_span)
+            yield cached; return
+    status, parts = "cancelled", []
+    try:
+        first, stream = _open_stream(prompt)
+        try:
+            for chunk in itertools.chain([first] if first is not None else [], stream):
+                if not parts: ollama_span.set(time_to_first_token_s=ollama_span.duration_s)
+                parts.append(chunk['response'])
+                if chunk.get('done'): _record_ollama_metrics(ollama_span, chunk)
+                yield chunk['response']
+            status = "ok"
+        finally:
+            # Reached via GeneratorExit when the caller closes us (e.g. the user navigated away);
+            # closing the HTTP stream makes Ollama stop generating.
+            stream.close()
     except Exception as e:
-        if "connection refused" in str(e).lower(): return "Error: Could not connect to the local Ollama server."
-        return f"Error during auto-upgrade: {e}"
\ No newline at end of file
+        status = "error"; ollama_span.set(error=f"{type(e).__name__}: {e}")
+        if isinstance(e, _OLLAMA_FAILURES): raise _ollama_error(e) from e
+        raise
+    finally:
+        finish_span(ollama_span, status)
+    response = "".join(parts)
+    if response.strip(): llm_cache.put(key, response)
+
+def _clean_stream(tokens, strip_bold=False):
+    """Token-by-token equivalent of `.strip()` (and `.replace("**", "")`) on the full response."""
+    buffer, started = "", False
+    for token in tokens:
+        buffer += token
+        if strip_bold: buffer = buffer.replace("**", "")
+        if not started:
+            buffer = buffer.lstrip(); started = bool(buffer)
+        # Trailing whitespace and a lone '*' are held back until the next token shows what follows them.
+        ready = buffer.rstrip()
+        if strip_bold and ready.endswith("*"): ready = ready[:-1]
+        if ready:
+            yield ready; buffer = buffer[len(ready):]
+    if buffer.strip(): yield buffer.strip()
+
+def _summary_stream(text_to_summarize, use_cache=True):
+    prompt, template = _final_summary_prompt(text_to_summarize, use_cache)
+    yield from _generate_stream(prompt, template, use_cache)
+
+def summarize_text_stream(text_to_summarize, use_cache=True):
+    """Streaming version of summarize_text; for long texts only the final reduce step streams."""
+    return _clean_stream(_summary_stream(text_to_summarize, use_cache))
+
+def generate_platform_post_stream(summary, platform, tone, use_cache=True):
+    """Streaming version of generate_platform_post."""
+    return _clean_stream(_generate_stream(_post_prompt(summary, platform, tone), "post", use_cache), strip_bold=True)
+
+def auto_upgrade_post_stream(post_text, platform, tone, language, use_cache=True):
+    """Streaming version of auto_upgrade_post."""
+    return _clean_stream(_generate_stream(_upgrade_prompt(post_text, platform, tone, language), "upgrade", use_cache), strip_bold=True)
+
+# --- Async counterparts, for fanning several generations out to Ollama at once ---
+
+def _async_client():
+    # httpx connection pools are bound to the event loop that created them, so keep one client per loop.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = ollama.AsyncClient(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT_S)
+    return client
+
+@_retry
+async def _acall(prompt, options=None):
+    return await _async_client().generate(**_request(prompt, options))
+
+async def _agenerate(prompt, template, use_cache=True, options=None):
+    """Async version of _generate, sharing the same response cache. options (e.g. temperature, seed) are part of the cache key."""
+    with span("ollama.generate", template=template, model=MODEL) as ollama_span:
+        key = llm_cache.make_key(MODEL, template, PROMPT_VERSIONS[template], prompt, options)
+        if use_cache:
+            cached = llm_cache.get(key)
+            ollama_span.set(cache_hit=cached is not None)
+            if cached is not None: return cached
+        try:
+            response = await _acall(prompt, options)
+        except _OLLAMA_FAILURES as e:
+            raise _ollama_error(e) from e
+        _record_ollama_metrics(ollama_span, response)
+        if response['response'].strip(): llm_cache.put(key, response['response'])
+        return response['response']
+
+async def asummarize_text(text_to_summarize, use_cache=True):
+    prompt, template = await asyncio.to_thread(_final_summary_prompt, text_to_summarize, use_cache)
+    return (await _agenerate(prompt, template, use_cache)).strip()
+
+async def agenerate_platform_post(summary, platform, tone, use_cache=True):
+    response = await _agenerate(_post_prompt(summary, platform, tone), "post", use_cache)
+    return response.strip().replace("**", "")
+
+async def atranslate_text(text, target_language, use_cache=True):
+    return (await _agenerate(_translate_prompt(text, target_language), "translate", use_cache)).strip()
+
+async def aauto_upgrade_post(post_text, platform, tone, language, use_cache=True):
+    response = await _agenerate(_upgrade_prompt(post_text, platform, tone, language), "upgrade", use_cache)
+    return response.strip().replace("**", "")
+
+async def agenerate_posts(summary, platforms, tone, target_language=None, use_cache=True, max_concurrency=OLLAMA_MAX_CONCURRENCY):
+    """Runs generate -> translate for every platform concurrently, yielding (platform, post, error) as each finishes.
+    error is the OllamaError that stopped that platform (post is then None), so one failure does not cancel the rest."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def pipeline(platform):
+        try:
+            async with semaphore:
+                post = await agenerate_platform_post(summary, platform, tone, use_cache)
+            if target_language:
+                async with semaphore:
+                    post = await atranslate_text(post, target_language, use_cache)
+        except OllamaError as e:
+            return platform, None, e
+        return platform, post, None
+    for next_done in asyncio.as_completed([pipeline(p) for p in platforms]):
+        yield await next_done
+
+def _variant_options(n, use_cache=True):
+    # Fixed seeds let cached variants be reused; a regeneration draws new ones, since the same seed would repeat the same text.
+    first_seed = 0 if use_cache else random.randrange(2**31)
+    low, high = VARIANT_TEMPERATURES
+    return [{"temperature": round(low + (high - low) * i / max(1, n - 1), 2), "seed": first_seed + i} for i in range(n)]
+
+async def abest_post_variant(post_text, platform, tone, language, n=POST_VARIANTS, use_cache=True, max_concurrency=OLLAMA_MAX_CONCURRENCY):
+    """Generates n upgraded rewrites of a post concurrently and returns (best rewrite, its engagement score).
+    Variants that fail are skipped; OllamaError is raised only if every one of them fails."""
+    prompt = _upgrade_prompt(post_text, platform, tone, language)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def variant(options):
+        async with semaphore:
+            return (await _agenerate(prompt, "upgrade", use_cache, options)).strip().replace("**", "")
+    results = await asyncio.gather(*(variant(options) for options in _variant_options(n, use_cache)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, OllamaError): raise result
+    candidates = [r for r in results if isinstance(r, str) and r]
+    if not candidates:
+        raise next((r for r in results if isinstance(r, OllamaError)), OllamaResponseError("Ollama returned only empty rewrites."))
+    scores = heuristics_engagement_scores(candidates)
+    best = int(scores.argmax())
+    return candidates[best], int(scores[best])
+
+def best_post_variant(post_text, platform, tone, language, n=POST_VARIANTS, use_cache=True):
+    """Blocking wrapper around abest_post_variant, for callers without an event loop."""
+    return asyncio.run(abest_post_variant(post_text, platform, tone, language, n, use_cache))
+
+def _pack_batches(texts, max_tokens=TRANSLATION_BATCH_TOKENS):
+    """Groups texts into consecutive batches whose estimated size fits the token budget."""
+    batch, used = [], 0
+    for text in texts:
+        cost = count_tokens(text) + 3
+        if batch and used + cost > max_tokens:
+            yield batch; batch, used = [], 0
+        batch.append(text); used += cost
+    if batch: yield batch
+
+def _parse_numbered_reply(reply, count):
+    """Maps '[n] text' lines back to their 0-based positions; unnumbered lines continue the previous item.
+    Returns {} unless the lines are numbered exactly 1..count in order: shifted or repeated numbers would misalign subtitles."""
+    numbers, parsed = [], []
+    for line in reply.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if match:
+            numbers.append(int(match.group(1))); parsed.append(match.group(2).strip())
+        elif parsed and line.strip():
+            parsed[-1] = f"{parsed[-1]} {line.strip()}"
+    if numbers != list(range(1, count + 1)): return {}
+    return {i: text for i, text in enumerate(parsed) if text}
+
+def _translate_batch(batch, target_language):
+    if len(batch) == 1: return [translate_text(batch[0], target_language)]
+    numbered = "\n".join(f"[{i}] {text}" for i, text in enumerate(batch, 1))
+    prompt = f"Translate each numbered line below into {target_language}. Reply with exactly {len(batch)} lines, one per input line, each starting with the same [number] as its source line. Provide only the translated lines, with no extra commentary or labels:\n\n{numbered}"
+    try:
+        parsed = _parse_numbered_reply(_generate(prompt, "translate_batch"), len(batch))
+    except OllamaResponseError:
+        parsed = {}
+    if not parsed:
+        # Numbering was off: retry each half, so only the lines the model keeps garbling end up as single calls.
+        middle = len(batch) // 2
+        return _translate_batch(batch[:middle], target_language) + _translate_batch(batch[middle:], target_language)
+    # Lines the model left empty are translated one at a time.
+    return [parsed[i] if i in parsed else translate_text(text, target_language) for i, text in enumerate(batch)]
+
+def translate_segments(texts, target_language):
+    """Translates a list of subtitle texts with as few model calls as possible, reusing earlier translations."""
+    results = [""] * len(texts)
+    pending = OrderedDict()
+    with _translation_memory_lock:
+        for i, text in enumerate(texts):
+            text = " ".join(text.split())
+            if not text: continue
+            cached = _translation_memory.get((text, target_language))
+            if cached is not None:
+                _translation_memory.move_to_end((text, target_language)); results[i] = cached
+            else:
+                pending.setdefault(text, []).append(i)
+    for batch in _pack_batches(list(pending)):
+        for text, translated in zip(batch, _translate_batch(batch, target_language)):
+            for i in pending[text]: results[i] = translated
+            with _translation_memory_lock:
+                _translation_memory[(text, target_language)] = translated
+                while len(_translation_memory) > TRANSLATION_MEMORY_SIZE: _translation_memory.popitem(last=False)
+    return results
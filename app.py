@@ -1,111 +1,127 @@
+import asyncio
 import os
 import tempfile
-import subprocess
 import zipfile
-import re
+import shutil
+import time
+from contextlib import closing
 from pathlib import Path
 
 import streamlit as st
 from st_copy_to_clipboard import st_copy_to_clipboard
 
-# --- AI imports ---
-try:
-    from ai_processor import summarize_text, generate_platform_post, translate_text, auto_upgrade_post, get_improvement_tips
-except Exception as e:
-    st.error(f"Error importing from ai_processor.py: {e}. Make sure the file exists and has no errors.")
-    def summarize_text(text): return "Error: Could not summarize."
-    def generate_platform_post(s, p, t): return "Error: Could not generate post."
-    def translate_text(t, l): return "Error: Could not translate."
-    def auto_upgrade_post(p, pl, t): return "Error: Could not auto-upgrade post."
-    def get_improvement_tips(t): return ["- Tip 1", "- Tip 2"]
-
-# Whisper import
-try:
-    import whisper
-except Exception:
-    whisper = None
+from ai_processor import translate_text, get_improvement_tips, agenerate_posts
+from ai_processor import summarize_text_stream, generate_platform_post_stream, auto_upgrade_post_stream
+from ai_processor import OllamaError, warm_up, best_post_variant, POST_VARIANTS
+
+# Whisper models are loaded once per server process and shared across sessions
+from media_processor import transcribe_with_whisper, generate_ass_from_segments, render_clip, render_clips
+from segment_store import SegmentStore
+from scoring import heuristics_engagement_score, rank_highlights
+from transcript_cache import spool_with_digest
+from tracing import Trace, set_trace, use_trace
 
 # ---------- Utility functions ----------
-def transcribe_with_whisper(video_path, model_name="base"):
-    if whisper is None: raise RuntimeError("Whisper not available. Install openai-whisper.")
-    model = whisper.load_model(model_name)
-    result = model.transcribe(video_path, fp16=False)
-    return result.get("segments", []), result.get("text", "")
-
-def ffmpeg_cut(input_path, start_s, duration_s, out_path):
-    cmd = ["ffmpeg", "-y", "-ss", str(start_s), "-i", str(input_path), "-t", str(duration_s), "-c", "copy", str(out_path)]
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except subprocess.CalledProcessError:
-        cmd2 = ["ffmpeg", "-y", "-ss", str(start_s), "-i", str(input_path), "-t", str(duration_s), "-c:v", "libx264", "-c:a", "aac", "-preset", "veryfast", str(out_path)]
-        subprocess.run(cmd2, check=True)
-        return True
-
-def ffmpeg_burn_subtitles(input_clip_path, ass_path, output_clip_path):
-    """Burns subtitles from a styled .ass file onto a video clip."""
-    safe_ass_path = str(ass_path).replace('\\', '/').replace(':', '\\:')
-    vf_string = f"subtitles=filename='{safe_ass_path}'"
-    cmd = ["ffmpeg", "-y", "-i", str(input_clip_path), "-vf", vf_string, "-c:a", "copy", str(output_clip_path)]
-    print("Running FFmpeg Command:", " ".join(cmd))
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Audio copy failed, trying re-encode. Error: {e.stderr.decode()}")
-        cmd2 = ["ffmpeg", "-y", "-i", str(input_clip_path), "-vf", vf_string, "-c:a", "aac", str(output_clip_path)]
-        print("Running FFmpeg Command (fallback):", " ".join(cmd2))
+CLIP_ROOT = Path(tempfile.gettempdir()) / "viralspark_clips"
+# Session clip directories untouched for this long belong to abandoned sessions and are deleted.
+CLIP_DIR_MAX_AGE_S = float(os.environ.get("CLIP_DIR_MAX_AGE_S", str(6 * 3600)))
+
+def evict_old_clip_dirs():
+    cutoff = time.time() - CLIP_DIR_MAX_AGE_S
+    for path in CLIP_ROOT.glob("session_*"):
         try:
-            subprocess.run(cmd2, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return True
-        except subprocess.CalledProcessError as e2:
-            print(f"Error burning subtitles (fallback attempt): {e2.stderr.decode()}")
-            return False
+            if path.stat().st_mtime < cutoff: shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+def clip_output_dir():
+    # Per-session directory so concurrent users and parallel renders never share file names.
+    if not st.session_state.get("clip_dir"):
+        CLIP_ROOT.mkdir(parents=True, exist_ok=True)
+        evict_old_clip_dirs()
+        st.session_state.clip_dir = tempfile.mkdtemp(prefix="session_", dir=CLIP_ROOT)
+    # Recreated in case it was evicted, and touched so eviction sees the session as active.
+    Path(st.session_state.clip_dir).mkdir(parents=True, exist_ok=True)
+    os.utime(st.session_state.clip_dir)
+    return st.session_state.clip_dir
 
 def generate_single_clip(clip_index, start_time, duration, target_language, clip_segments, custom_text):
     try:
-        temp_dir = Path(tempfile.gettempdir())
-        raw_clip_path = temp_dir / f"raw_clip_{clip_index+1}.mp4"
-        ass_path = temp_dir / f"subs_{clip_index+1}.ass"
-        final_clip_path = temp_dir / f"final_clip_{clip_index+1}.mp4"
         clip_key = f"clip_path_{clip_index}"
         video_file_path = st.session_state.uploaded_file_path
-        ffmpeg_cut(video_file_path, start_time, duration, raw_clip_path)
-        adjusted_segments = []
-        for seg in clip_segments:
-            new_start = max(0, seg['start'] - start_time)
-            new_end = min(duration, seg['end'] - start_time)
-            if new_start < new_end:
-                adjusted_segments.append({'start': new_start, 'end': new_end, 'text': seg['text']})
-        ass_content, final_translated_text = generate_ass_from_segments(adjusted_segments, target_language)
-        with open(ass_path, "w", encoding="utf-8") as ass_file:
-            ass_file.write(ass_content)
-        ffmpeg_burn_subtitles(raw_clip_path, ass_path, final_clip_path)
+        final_clip_path, final_translated_text = render_clip(video_file_path, clip_index, start_time, duration, target_language, clip_segments, clip_output_dir())
         st.session_state[clip_key] = str(final_clip_path)
         return str(final_clip_path), final_translated_text
     except Exception as e:
         st.error(f"Failed to generate Clip {clip_index + 1}: {e}")
         return None, None
 
+def session_trace():
+    # One trace per analyzed piece of content; "Analyze New Content" clears it with the rest of the session.
+    if "trace" not in st.session_state:
+        st.session_state.trace = Trace("analyze")
+    return st.session_state.trace
+
+def render_timing_panel():
+    trace = session_trace()
+    with st.expander("⏱️ Timing & Traces"):
+        rows = trace.summary()
+        if not rows:
+            st.caption("No timings recorded yet."); return
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        json_col, otlp_col = st.columns(2)
+        with json_col:
+            st.download_button("⬇️ Spans (JSON)", data=trace.to_json(), file_name="trace.json", mime="application/json", use_container_width=True)
+        with otlp_col:
+            st.download_button("⬇️ OpenTelemetry (OTLP JSON)", data=trace.to_otlp_json(), file_name="trace_otlp.json", mime="application/json", use_container_width=True)
+
 def handle_generate_clip_click(clip_index, start_time, duration, target_language, clip_segments):
     text_key = f"custom_text_{clip_index}"
     custom_text = st.session_state[text_key]
-    with st.spinner(f"Generating Clip {clip_index+1}..."):
+    # Widget callbacks run before the script body has set the session's trace.
+    with use_trace(session_trace()), st.spinner(f"Generating Clip {clip_index+1}..."):
         clip_path, translated_text = generate_single_clip(clip_index, start_time, duration, target_language, clip_segments, custom_text)
         if clip_path and translated_text:
             st.session_state[text_key] = translated_text
             st.toast(f"✅ Clip {clip_index+1} generated successfully!")
 
-def heuristics_engagement_score(post_text):
-    score = 50; l = len(post_text)
-    if l < 40: score += 5
-    elif l < 200: score += 10
-    else: score -= 5
-    emojis = sum(1 for ch in post_text if ch in "😀😁😂🤣😍🔥✨💡🎯👍🙌"); score += min(10, emojis * 4)
-    tags = post_text.count("#"); score += min(10, tags * 3)
-    for w in ["subscribe","follow","comment","share","link in bio","join"]:
-        if w in post_text.lower(): score += 4
-    return max(0, min(100, score))
+@st.cache_resource(show_spinner=False)
+def start_ollama_warm_up():
+    # Once per server process: the model loads while the first user is still choosing a file.
+    return warm_up()
+
+@st.cache_resource(max_entries=8, ttl=900, show_spinner=False)
+def load_clip_bytes(path, mtime_ns, size):
+    """Reads a rendered clip once; re-rendering changes mtime/size and therefore the cache key.
+    At most eight clips are held, and each for at most 15 minutes."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def clip_bytes(path):
+    stat = os.stat(path)
+    return load_clip_bytes(str(path), stat.st_mtime_ns, stat.st_size)
+
+def forget_download(key):
+    st.session_state.pop(key, None)
+
+def on_demand_download(label, path, file_name, mime, key, cached=True):
+    """A download button whose file is only read after the user asks for it, and released once it is downloaded."""
+    if st.session_state.get(key) != path:
+        if st.button(label, key=f"prepare_{key}", use_container_width=True):
+            st.session_state[key] = path; st.rerun()
+        return
+    if cached:
+        data = clip_bytes(path)
+    else:
+        with open(path, "rb") as f: data = f.read()
+    st.download_button(f"{label} (ready)", data=data, file_name=file_name, mime=mime, use_container_width=True,
+                       key=f"download_{key}", on_click=forget_download, args=(key,))
+
+def stream_text(placeholder, tokens):
+    """Writes model output as it arrives and returns the full text.
+    If Streamlit stops the script mid-stream (rerun or navigation), closing the generator cancels the Ollama request."""
+    with closing(tokens):
+        return placeholder.write_stream(tokens)
 
 def score_label(score: int) -> str:
     if score >= 80: return f"🔥 Viral-ready ({score}/100)"
@@ -120,41 +136,6 @@ def render_tips_box(tone):
     tips_html += "</div>"
     st.markdown(tips_html, unsafe_allow_html=True)
 
-def generate_ass_from_segments(segments, target_language="English"):
-    """Generates a styled .ass subtitle file string from timed segments."""
-    font_file_path = os.path.join(os.getcwd(), 'fonts', 'Roboto-Regular.ttf').replace('\\', '/')
-    Path(os.path.dirname(font_file_path)).mkdir(parents=True, exist_ok=True)
-    if not Path(font_file_path).exists():
-        print(f"WARNING: Font file not found at {font_file_path}. Subtitles might not render correctly.")
-    ass_header = f"""[Script Info]
-Title: Generated Subtitles
-ScriptType: v4.00+
-WrapStyle: 0
-ScaledBorderAndShadow: yes
-YCbCr Matrix: None
-PlayResX: 1280
-PlayResY: 720
-Font: {font_file_path}
-[V4+ Styles]
-Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,Roboto Regular,22,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,1.5,1,2,10,10,25,1
-[Events]
-Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
-"""
-    ass_dialogue = ""
-    full_translated_text = []
-    for seg in segments:
-        start_time = seg.get("start", 0)
-        end_time = seg.get("end", 0)
-        text = seg.get("text", "").strip()
-        start_ass = f"{int(start_time//3600)}:{int((start_time%3600)//60):02}:{int(start_time%60):02}.{int((start_time*100)%100):02}"
-        end_ass = f"{int(end_time//3600)}:{int((end_time%3600)//60):02}:{int(end_time%60):02}.{int((end_time*100)%100):02}"
-        translated_text = translate_text(text, target_language) if target_language != "Original" else text
-        full_translated_text.append(translated_text)
-        cleaned_text = translated_text.replace('\n', '\\N').replace('{', '\\{').replace('}', '\\}')
-        ass_dialogue += f"Dialogue: 0,{start_ass},{end_ass},Default,,0,0,0,,{cleaned_text}\n"
-    return ass_header + ass_dialogue, " ".join(full_translated_text)
-
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="ViralSpark Studio", layout="wide")
 
@@ -199,6 +180,10 @@ st.markdown("""
 default_state = {"stage": "input", "segments": [], "transcript": "", "summary": "", "generated": {}, "clips": [], "uploaded_file": None, "article_text": "", "translated_text": "", "srt_captions": "", "analyze_clicked": False}
 for key, val in default_state.items():
     if key not in st.session_state: st.session_state[key] = val
+set_trace(session_trace())
+# Every rerun of a session that has rendered or uploaded media keeps its directory from being evicted.
+if st.session_state.get("clip_dir"): clip_output_dir()
+start_ollama_warm_up()
 
 progress_placeholder = st.empty()
 def update_progress(step: int):
@@ -235,19 +220,24 @@ if st.session_state.stage == "input":
                 if uploaded:
                     update_progress(1)
                     with st.spinner("Transcribing... ⏳"):
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded.name).suffix) as tmp:
-                            tmp.write(uploaded.getvalue())
-                            st.session_state.uploaded_file_path = tmp.name
-                        segments, full_text = transcribe_with_whisper(st.session_state.uploaded_file_path, "base")
-                        st.session_state.segments = segments
+                        # Spool the upload to disk in chunks (no full in-memory copy) and hash it on the way for the transcript cache.
+                        # It goes in the session's clip directory, so a reset or eviction deletes it with the clips.
+                        uploaded.seek(0)
+                        upload_path = Path(clip_output_dir()) / f"upload{Path(uploaded.name).suffix}"
+                        with open(upload_path, "wb") as spool:
+                            media_hash = spool_with_digest(uploaded, spool)
+                        st.session_state.uploaded_file_path = str(upload_path)
+                        segments, full_text = transcribe_with_whisper(st.session_state.uploaded_file_path, "base", media_hash=media_hash)
+                        st.session_state.segments = SegmentStore(segments)
                         st.session_state.transcript = full_text
-                        st.session_state.uploaded_file = uploaded
+                        # Only the name is kept; the media itself lives in the spooled file.
+                        st.session_state.uploaded_file = uploaded.name
                 elif article_text:
                     full_text = article_text; st.session_state.transcript = article_text; st.session_state.article_text = article_text
                 
                 update_progress(2)
                 with st.spinner("Summarizing... 📝"):
-                    st.session_state.summary = summarize_text(full_text)
+                    st.session_state.summary = stream_text(st.empty(), summarize_text_stream(full_text))
 
                 st.session_state.stage = "create"; st.session_state.analyze_clicked = False; st.rerun()
             except Exception as err:
@@ -268,7 +258,10 @@ if st.session_state.stage == "create":
                 st.subheader("🌍 Article/Text Translation")
                 if st.button("Translate Full Article"):
                     with st.spinner(f"Translating to {target_language}..."):
-                        st.session_state.translated_text = translate_text(st.session_state.transcript, target_language)
+                        try:
+                            st.session_state.translated_text = translate_text(st.session_state.transcript, target_language)
+                        except OllamaError as e:
+                            st.error(f"Could not translate the article: {e}")
                 if st.session_state.get("translated_text"):
                     st.text_area("Translated Article", value=st.session_state.translated_text, height=150)
                     st.download_button("⬇️ Download Translated Article", data=st.session_state.translated_text, file_name=f"translated_{target_language}.txt")
@@ -276,8 +269,11 @@ if st.session_state.stage == "create":
                 st.subheader("🎬 Full Video Captions (.srt)")
                 if st.button("Generate Full Captions"):
                     with st.spinner(f"Generating captions in {target_language}..."):
-                        srt_content, _ = generate_ass_from_segments (st.session_state.segments, target_language)
-                        st.session_state.srt_captions = srt_content
+                        try:
+                            srt_content, _ = generate_ass_from_segments (st.session_state.segments, target_language)
+                            st.session_state.srt_captions = srt_content
+                        except OllamaError as e:
+                            st.error(f"Could not translate the captions: {e}")
                 if st.session_state.get("srt_captions"):
                     st.text_area("SRT Captions Preview", value=st.session_state.srt_captions, height=150)
                     st.download_button("⬇️ Download Captions (.srt)", data=st.session_state.srt_captions, file_name=f"captions_{target_language}.srt")
@@ -293,7 +289,11 @@ if st.session_state.stage == "create":
                 num_clips = st.number_input("Max auto clips", min_value=0, max_value=10, value=0)
 
             if clip_len > 0 and num_clips > 0:
-                segments_to_display = st.session_state.segments[:num_clips]
+                # Clips start at the highest-scoring, non-overlapping windows of the transcript.
+                segments_to_display = rank_highlights(st.session_state.segments, clip_len, num_clips, st.session_state.summary)
+                clip_jobs = []
+                # Subtitles from a batch render are applied here, before the text widgets are created.
+                pending_subtitles = st.session_state.pop("pending_subtitles", {})
                 
                 for i, seg in enumerate(segments_to_display):
                     with st.container(border=True):
@@ -302,8 +302,11 @@ if st.session_state.stage == "create":
                         start_time = seg.get("start", 0)
                         end_time = start_time + clip_len
                         
-                        current_clip_segments = [s for s in st.session_state.segments if s['start'] < end_time and s['end'] > start_time]
+                        current_clip_segments = st.session_state.segments.overlapping(start_time, end_time)
+                        clip_jobs.append((i, start_time, clip_len, current_clip_segments))
                         
+                        if i in pending_subtitles:
+                            st.session_state[text_key] = pending_subtitles[i]
                         if text_key not in st.session_state:
                             st.session_state[text_key] = " ".join([s.get("text", "").strip() for s in current_clip_segments])
 
@@ -318,17 +321,9 @@ if st.session_state.stage == "create":
                             with player_col:
                                 clip_path = st.session_state[clip_key]
                                 if Path(clip_path).exists():
-                                    with open(clip_path, "rb") as f:
-                                        video_bytes = f.read()
-                                    
-                                    st.video(video_bytes)
-                                    st.download_button(
-                                        label="⬇️ Download Clip",
-                                        data=video_bytes,
-                                        file_name=Path(clip_path).name,
-                                        mime="video/mp4",
-                                        use_container_width=True
-                                    )
+                                    # The player and the download share one cached copy instead of re-reading the file every rerun.
+                                    st.video(clip_bytes(clip_path))
+                                    on_demand_download("⬇️ Download Clip", clip_path, Path(clip_path).name, "video/mp4", key=f"download_clip_{i}")
                         else:
                             st.markdown(f"**Clip {i+1}**")
                             st.caption(f"Time: {start_time:.1f}s to {end_time:.1f}s")
@@ -345,7 +340,31 @@ if st.session_state.stage == "create":
                 
                 if num_clips > 1:
                     if st.button("⬇️ Generate & Download All as ZIP", use_container_width=True, type="primary"):
-                        st.warning("The 'Download All' feature is being updated. Please generate clips individually for now.")
+                        zip_path = Path(clip_output_dir()) / "all_clips.zip"
+                        progress = st.progress(0.0, text=f"Rendering {len(clip_jobs)} clips...")
+                        rendered = {}
+                        # Clips render in parallel; each finished MP4 is copied into the archive from disk, never held in memory.
+                        try:
+                            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+                                jobs = render_clips(st.session_state.uploaded_file_path, clip_jobs, target_language, clip_output_dir())
+                                for done, (i, clip_path, translated_text, error) in enumerate(jobs, 1):
+                                    if error is not None:
+                                        st.error(f"Failed to generate Clip {i + 1}: {error}")
+                                    else:
+                                        zf.write(clip_path, arcname=f"clip_{i+1}.mp4")
+                                        st.session_state[f"clip_path_{i}"] = str(clip_path)
+                                        rendered[i] = translated_text
+                                    progress.progress(done / len(clip_jobs), text=f"Rendered {done}/{len(clip_jobs)} clips (Clip {i+1} {'failed' if error else 'done'})")
+                        except OllamaError as e:
+                            # Subtitles for every clip are translated before the first render starts.
+                            st.error(f"Could not translate the clip subtitles: {e}")
+                        if rendered:
+                            st.session_state.clips_zip_path = str(zip_path)
+                            st.session_state.pending_subtitles = rendered
+                            st.rerun()
+                    if st.session_state.get("clips_zip_path") and Path(st.session_state.clips_zip_path).exists():
+                        # The archive is never cached; it is read only for the rerun that offers the download.
+                        on_demand_download("⬇️ Download All Clips (.zip)", st.session_state.clips_zip_path, "clips.zip", "application/zip", key="download_zip", cached=False)
 
     with create_tab:
         st.header("🎨 Creation Studio")
@@ -361,19 +380,34 @@ if st.session_state.stage == "create":
         tone_preset = st.selectbox("Tone preset", options=["Witty, concise, emojis", "Professional & formal", "Motivational & upbeat", "Casual conversational", "Emotional & heartfelt", "Informative & educational", "Persuasive & promotional", "Humorous & sarcastic", "Inspirational thought-leader", "Storytelling / narrative"])
         st.divider()
         platform_choice = st.selectbox("📌 Select a platform:",["▶️ YouTube", "🎵 TikTok", "🐦 Twitter", "👨‍💼 LinkedIn", "🌍 All Platforms"])
+        # Identical requests are served from the response cache unless the user asks for a fresh take.
+        use_cache = not st.checkbox("♻️ Regenerate (skip cached results)", key="regenerate_posts")
         
         if st.button("✨ Generate Post", use_container_width=True, type="primary"):
             platforms = ["YouTube", "TikTok", "Twitter", "LinkedIn"] if platform_choice=="🌍 All Platforms" else [platform_choice.split(" ",1)[1]]
+            translate_to = post_target_language if post_target_language != "Original (English)" else None
             with st.spinner("Generating posts..."):
-                for p in platforms:
-                    base_post = generate_platform_post(st.session_state.summary, p, tone_preset)
-                    
-                    if post_target_language != "Original (English)":
-                        final_post = translate_text(base_post, post_target_language)
-                    else:
-                        final_post = base_post
-                    
-                    st.session_state.generated[p] = final_post
+                previews = st.empty()
+                if len(platforms) == 1:
+                    p = platforms[0]
+                    try:
+                        final_post = stream_text(previews, generate_platform_post_stream(st.session_state.summary, p, tone_preset, use_cache=use_cache))
+                        if translate_to:
+                            final_post = translate_text(final_post, translate_to, use_cache=use_cache)
+                        st.session_state.generated[p] = final_post
+                    except OllamaError as e:
+                        st.error(f"Could not generate the {p} post: {e}")
+                else:
+                    # Platforms run concurrently; each post is previewed the moment its pipeline finishes.
+                    preview_box = previews.container()
+                    async def collect_posts():
+                        async for p, final_post, error in agenerate_posts(st.session_state.summary, platforms, tone_preset, translate_to, use_cache=use_cache):
+                            if error is not None:
+                                st.error(f"Could not generate the {p} post: {error}"); continue
+                            st.session_state.generated[p] = final_post
+                            preview_box.success(f"✅ {p} post ready"); preview_box.text(final_post)
+                    asyncio.run(collect_posts())
+                previews.empty()
         
         if st.session_state.get("generated"):
             for platform, post in st.session_state.generated.items():
@@ -387,16 +421,36 @@ if st.session_state.stage == "create":
                     render_tips_box(tone_preset)
                     
                     # The button logic follows inside the same 'if' block
-                    if st.button(f"🔧 Auto-Upgrade {platform} Post", key=f"upgrade_{platform}"):
-                        with st.spinner("✨ Enhancing post..."):
-                            lang = st.session_state.create_lang_select
-                            improved_post = auto_upgrade_post(post, platform, tone_preset, lang)
-                        st.session_state.generated[platform] = improved_post
-                        st.rerun()
+                    upgrade_col, best_col = st.columns(2)
+                    with upgrade_col:
+                        upgrade_clicked = st.button(f"🔧 Auto-Upgrade {platform} Post", key=f"upgrade_{platform}", use_container_width=True)
+                    with best_col:
+                        # All variants are generated at once, so this takes about as long as a single upgrade.
+                        best_clicked = st.button(f"🏆 Best of {POST_VARIANTS} Rewrites", key=f"best_of_{platform}", use_container_width=True)
+                    lang = st.session_state.create_lang_select
+                    if upgrade_clicked:
+                        try:
+                            with st.spinner("✨ Enhancing post..."):
+                                improved_post = stream_text(st.empty(), auto_upgrade_post_stream(post, platform, tone_preset, lang, use_cache=use_cache))
+                            st.session_state.generated[platform] = improved_post
+                            st.rerun()
+                        except OllamaError as e:
+                            st.error(f"Could not upgrade the {platform} post: {e}")
+                    if best_clicked:
+                        try:
+                            with st.spinner(f"✨ Writing {POST_VARIANTS} variants and keeping the best..."):
+                                best_post, best_score = best_post_variant(post, platform, tone_preset, lang, use_cache=use_cache)
+                            st.session_state.generated[platform] = best_post
+                            st.toast(f"🏆 Kept the best of {POST_VARIANTS} rewrites (score {best_score}/100)")
+                            st.rerun()
+                        except OllamaError as e:
+                            st.error(f"Could not rewrite the {platform} post: {e}")
     st.divider()
+    render_timing_panel()
     _, center_col, _ = st.columns([2, 1, 2])
     with center_col:
         if st.button("✨ Analyze New Content", use_container_width=True, type="primary"):
+            if st.session_state.get("clip_dir"): shutil.rmtree(st.session_state.clip_dir, ignore_errors=True)
             for key in list(st.session_state.keys()):
                 if key != 'stage': del st.session_state[key]
             st.session_state.stage = "input"; st.rerun()
\ No newline at end of file
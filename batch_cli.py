@@ -0,0 +1,236 @@
+"""Headless bulk repurposing: transcribe -> summarize -> posts -> clips -> captions for many inputs.
+
+    python batch_cli.py ./videos --out ./batch_output --workers 2
+    python batch_cli.py jobs.jsonl --out ./batch_output --platforms YouTube,LinkedIn --num-clips 3
+
+A manifest line looks like {"id": "ep12", "path": "ep12.mp4"} or {"id": "post1", "text": "..."}; any of
+platforms, tone, language, clip_len, num_clips and caption_language may be given per line to override
+the command-line defaults. Each job writes its artifacts and a state.json to <out>/<id>/, and finished
+stages are skipped when the batch is run again. trace.json holds the spans of the latest run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from ai_processor import agenerate_posts, summarize_text, warm_up
+from media_processor import TRANSCRIBE_WORKERS, generate_ass_from_segments, render_clips, transcribe_with_whisper
+from scoring import rank_highlights
+from segment_store import SegmentStore
+from tracing import Trace, span, use_trace
+
+MEDIA_SUFFIXES = {".mp4", ".mov", ".wav", ".mp3"}
+TEXT_SUFFIXES = {".txt", ".md"}
+STAGES = ["transcribe", "summarize", "posts", "clips", "captions"]
+DEFAULT_PLATFORMS = ["YouTube", "TikTok", "Twitter", "LinkedIn"]
+
+
+def _job_id(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("._") or "job"
+
+
+def load_jobs(source, defaults):
+    """Builds job dicts from a directory of media/text files or a JSONL manifest."""
+    source = Path(source)
+    jobs = []
+    if source.is_dir():
+        for path in sorted(source.iterdir()):
+            suffix = path.suffix.lower()
+            if suffix in MEDIA_SUFFIXES:
+                jobs.append({**defaults, "id": _job_id(path.name), "path": str(path.resolve())})
+            elif suffix in TEXT_SUFFIXES:
+                jobs.append({**defaults, "id": _job_id(path.name), "text": path.read_text(encoding="utf-8")})
+    else:
+        with open(source, encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                if not line.strip(): continue
+                entry = json.loads(line)
+                if entry.get("path") and not Path(entry["path"]).is_absolute():
+                    entry["path"] = str((source.parent / entry["path"]).resolve())
+                jobs.append({**defaults, **entry, "id": _job_id(str(entry.get("id") or f"job_{n:04d}"))})
+    seen = set()
+    for job in jobs:
+        if job["id"] in seen: raise ValueError(f"Duplicate job id '{job['id']}'")
+        seen.add(job["id"])
+        if job.get("path"):
+            if not Path(job["path"]).is_file(): raise ValueError(f"Job '{job['id']}': media file not found: {job['path']}")
+        elif not isinstance(job.get("text"), str) or not job["text"].strip():
+            raise ValueError(f"Job '{job['id']}' needs a 'path' to a media file or a non-empty 'text'")
+    return jobs
+
+
+class JobState:
+    """state.json for one job: finished stages, their timings, and the last error."""
+
+    def __init__(self, job_dir):
+        self.path = Path(job_dir) / "state.json"
+        self.data = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {"done": {}, "error": None}
+
+    def is_done(self, stage):
+        return stage in self.data["done"]
+
+    def mark_done(self, stage, seconds):
+        self.data["done"][stage] = round(seconds, 3)
+        self.data["error"] = None
+        self.save()
+
+    def fail(self, stage, error):
+        self.data["error"] = {"stage": stage, "message": str(error)}
+        self.save()
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+def _write_json(path, data):
+    Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _stage_transcribe(job, job_dir, transcribe_workers):
+    if not job.get("path"):
+        (job_dir / "transcript.txt").write_text(job["text"], encoding="utf-8")
+        return
+    segments, text = transcribe_with_whisper(job["path"], job.get("whisper_model", "base"), workers=transcribe_workers)
+    (job_dir / "transcript.txt").write_text(text, encoding="utf-8")
+    _write_json(job_dir / "segments.json", list(SegmentStore(segments)))
+
+
+def _stage_summarize(job, job_dir):
+    transcript = (job_dir / "transcript.txt").read_text(encoding="utf-8")
+    (job_dir / "summary.txt").write_text(summarize_text(transcript), encoding="utf-8")
+
+
+def _stage_posts(job, job_dir):
+    summary = (job_dir / "summary.txt").read_text(encoding="utf-8")
+    language = job.get("language")
+    async def collect():
+        posts = {}
+        async for platform, post, error in agenerate_posts(summary, job["platforms"], job["tone"], language):
+            if error is not None: raise RuntimeError(f"{platform} post failed: {error}")
+            posts[platform] = post
+        return posts
+    _write_json(job_dir / "posts.json", asyncio.run(collect()))
+
+
+def _load_segments(job_dir):
+    path = job_dir / "segments.json"
+    return SegmentStore(json.loads(path.read_text(encoding="utf-8"))) if path.exists() else SegmentStore()
+
+
+def _stage_clips(job, job_dir):
+    segments = _load_segments(job_dir)
+    if not job.get("path") or not len(segments) or not job["num_clips"]: return
+    summary = (job_dir / "summary.txt").read_text(encoding="utf-8")
+    highlights = rank_highlights(segments, job["clip_len"], job["num_clips"], summary)
+    clips = [(i, h["start"], job["clip_len"], segments.overlapping(h["start"], h["end"])) for i, h in enumerate(highlights)]
+    clip_dir = job_dir / "clips"
+    clip_dir.mkdir(exist_ok=True)
+    manifest = []
+    for i, clip_path, text, error in render_clips(job["path"], clips, job["caption_language"], clip_dir):
+        if error is not None: raise RuntimeError(f"Clip {i + 1} failed: {error}")
+        manifest.append({"clip": i + 1, "path": str(Path(clip_path).relative_to(job_dir)), "start": highlights[i]["start"],
+                         "score": highlights[i]["score"], "subtitles": text})
+    _write_json(job_dir / "clips.json", sorted(manifest, key=lambda c: c["clip"]))
+
+
+def _stage_captions(job, job_dir):
+    segments = _load_segments(job_dir)
+    if not len(segments): return
+    ass_content, _ = generate_ass_from_segments(list(segments), job["caption_language"])
+    (job_dir / f"captions_{job['caption_language']}.ass").write_text(ass_content, encoding="utf-8")
+
+
+def run_job(job, out_dir, transcribe_workers):
+    """Runs the unfinished stages of one job. Returns (job id, stage timings, error or None)."""
+    job_dir = Path(out_dir) / job["id"]
+    job_dir.mkdir(parents=True, exist_ok=True)
+    state = JobState(job_dir)
+    stages = {
+        "transcribe": lambda: _stage_transcribe(job, job_dir, transcribe_workers),
+        "summarize": lambda: _stage_summarize(job, job_dir),
+        "posts": lambda: _stage_posts(job, job_dir),
+        "clips": lambda: _stage_clips(job, job_dir),
+        "captions": lambda: _stage_captions(job, job_dir),
+    }
+    timings, error = {}, None
+    trace = Trace(job["id"])
+    with use_trace(trace):
+        for stage in STAGES:
+            if state.is_done(stage): continue
+            started = time.perf_counter()
+            try:
+                with span(f"stage.{stage}"):
+                    stages[stage]()
+            except Exception as e:
+                state.fail(stage, e)
+                error = f"{stage}: {e}"
+                break
+            timings[stage] = time.perf_counter() - started
+            state.mark_done(stage, timings[stage])
+    if trace.spans:
+        (job_dir / "trace.json").write_text(trace.to_json(), encoding="utf-8")
+    return job["id"], timings, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repurpose a batch of videos, audio files or texts without the Streamlit UI.")
+    parser.add_argument("source", help="directory of media/text files, or a JSONL manifest")
+    parser.add_argument("--out", default="batch_output", help="output directory (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=2, help="jobs processed concurrently (default: %(default)s)")
+    parser.add_argument("--transcribe-workers", type=int, default=TRANSCRIBE_WORKERS, help="processes per chunked transcription (default: %(default)s)")
+    parser.add_argument("--platforms", default=",".join(DEFAULT_PLATFORMS), help="comma-separated platforms (default: %(default)s)")
+    parser.add_argument("--tone", default="Witty, concise, emojis")
+    parser.add_argument("--language", default=None, help="translate posts into this language")
+    parser.add_argument("--clip-len", type=int, default=30)
+    parser.add_argument("--num-clips", type=int, default=3)
+    parser.add_argument("--caption-language", default="Original", help="subtitle language for clips and captions (default: %(default)s)")
+    parser.add_argument("--whisper-model", default="base")
+    parser.add_argument("--force", action="store_true", help="ignore saved job state and rerun every stage")
+    args = parser.parse_args(argv)
+
+    defaults = {"platforms": [p.strip() for p in args.platforms.split(",") if p.strip()], "tone": args.tone, "language": args.language,
+                "clip_len": args.clip_len, "num_clips": args.num_clips, "caption_language": args.caption_language, "whisper_model": args.whisper_model}
+    try:
+        jobs = load_jobs(args.source, defaults)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if args.force:
+        for job in jobs: (out_dir / job["id"] / "state.json").unlink(missing_ok=True)
+    print(f"Processing {len(jobs)} jobs with {args.workers} workers -> {out_dir}")
+    warm_up()
+
+    started = time.perf_counter()
+    stage_totals = {stage: 0.0 for stage in STAGES}
+    failed, ran = {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(run_job, job, out_dir, args.transcribe_workers) for job in jobs]
+        for n, future in enumerate(as_completed(futures), 1):
+            job_id, timings, error = future.result()
+            for stage, seconds in timings.items(): stage_totals[stage] += seconds
+            if error: failed[job_id] = error
+            # Only jobs that ran and finished in this invocation count towards throughput; resumed-and-skipped and failed ones do not.
+            if timings and not error: ran += 1
+            print(f"[{n}/{len(jobs)}] {job_id}: {'FAILED ' + error if error else 'done'} ({sum(timings.values()):.1f}s)")
+    elapsed = time.perf_counter() - started
+
+    report = {"jobs": len(jobs), "succeeded": len(jobs) - len(failed), "failed": failed, "ran": ran, "already_done": len(jobs) - ran - len(failed),
+              "elapsed_s": round(elapsed, 3), "jobs_per_hour": round(ran / elapsed * 3600, 2) if elapsed > 0 and ran else None,
+              "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stage_totals.items()}}
+    _write_json(out_dir / "report.json", report)
+    print(f"Finished {report['succeeded']}/{len(jobs)} jobs in {elapsed:.1f}s ({ran} run, {len(failed)} failed, {report['already_done']} already done; {report['jobs_per_hour']} jobs/hour)")
+    for stage, seconds in report["stage_seconds"].items():
+        print(f"  {stage:<11} {seconds:8.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
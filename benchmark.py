@@ -0,0 +1,239 @@
+"""Offline pipeline benchmark: a fake Ollama server, synthetic media and per-stage timings as JSON.
+
+    python benchmark.py --durations 30,120 --repeat 3 --output bench.json
+    python benchmark.py --compare bench.json          # rerun and print the change against a saved run
+
+Ollama calls go to a local stand-in that answers with filler text after --latency-ms and at
+--tokens-per-s, so LLM stages measure this app's overhead and concurrency rather than the model.
+Transcription runs only if the Whisper weights are already in the local cache.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+_FILLER = ("content creators repurpose long videos into short clips and posts for every platform "
+           "so that one recording reaches a much wider audience with little extra work").split()
+_NUMBERED = re.compile(r"^\[(\d+)\] ", re.M)
+
+
+class FakeOllamaServer:
+    """Minimal /api/generate endpoint (blocking and streaming) with configurable latency and token rate."""
+
+    def __init__(self, latency_s=0.2, tokens_per_s=50.0, response_tokens=60):
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.response_tokens = response_tokens
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = json.dumps({"models": [], "version": "0.0.0-fake"}).encode()
+                self.send_response(200); self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body))); self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests += 1
+                if self.path == "/api/generate": server._generate(self, request)
+                else: self.send_error(404)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.host = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def _tokens(self, prompt):
+        # Batched translation prompts get one numbered reply line per input line so the parser stays on its fast path.
+        numbers = _NUMBERED.findall(prompt)
+        if numbers:
+            return [f"[{n}] {' '.join(random.sample(_FILLER, 6))}\n" for n in numbers]
+        return [random.choice(_FILLER) + " " for _ in range(self.response_tokens)]
+
+    def _generate(self, handler, request):
+        tokens = self._tokens(request.get("prompt", ""))
+        prompt_tokens = len(request.get("prompt", "")) // 4 + 1
+        started = time.perf_counter()
+        time.sleep(self.latency_s)
+        final = {"model": request.get("model", ""), "created_at": datetime.now(timezone.utc).isoformat(), "done": True, "done_reason": "stop",
+                 "load_duration": 0, "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(self.latency_s * 1e9), "eval_count": len(tokens)}
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / self.tokens_per_s)
+            final.update(response="".join(tokens), total_duration=int((time.perf_counter() - started) * 1e9), eval_duration=int(len(tokens) / self.tokens_per_s * 1e9))
+            body = json.dumps(final).encode()
+            handler.send_response(200); handler.send_header("Content-Type", "application/json"); handler.send_header("Content-Length", str(len(body))); handler.end_headers()
+            handler.wfile.write(body)
+            return
+        handler.send_response(200); handler.send_header("Content-Type", "application/x-ndjson"); handler.send_header("Transfer-Encoding", "chunked"); handler.end_headers()
+        def send(obj):
+            line = json.dumps(obj).encode() + b"\n"
+            handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n"); handler.wfile.flush()
+        try:
+            for token in tokens:
+                time.sleep(1 / self.tokens_per_s)
+                send({"model": final["model"], "created_at": final["created_at"], "response": token, "done": False})
+            final.update(response="", total_duration=int((time.perf_counter() - started) * 1e9), eval_duration=int(len(tokens) / self.tokens_per_s * 1e9))
+            send(final)
+            handler.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown(); self._httpd.server_close()
+
+
+def make_media(path, duration_s, with_video=True):
+    """Synthesizes a test pattern with a tone (or tone only) using ffmpeg's lavfi sources."""
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    if with_video: cmd += ["-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duration_s}"]
+    cmd += ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=16000:duration={duration_s}"]
+    if with_video: cmd += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"]
+    # AAC for the MP4; a .wav gets plain 16-bit PCM so it is an ordinary WAV file.
+    cmd += ["-c:a", "pcm_s16le" if Path(path).suffix.lower() == ".wav" else "aac", "-shortest", str(path)]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def make_segments(duration_s, seconds_per_segment=3.0):
+    rng = random.Random(duration_s)
+    return [{"start": t, "end": min(duration_s, t + seconds_per_segment), "text": " ".join(rng.choices(_FILLER, k=8))}
+            for t in [i * seconds_per_segment for i in range(int(duration_s // seconds_per_segment))]]
+
+
+def _whisper_weights_cached(model_name):
+    cache_dir = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "whisper"
+    return (cache_dir / f"{model_name}.pt").exists()
+
+
+def time_stage(fn, repeat, reset=None):
+    runs = []
+    for _ in range(repeat):
+        if reset: reset()
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return {"runs": len(runs), "min_s": round(min(runs), 4), "median_s": round(statistics.median(runs), 4), "mean_s": round(statistics.fmean(runs), 4)}
+
+
+def run_benchmarks(args, work_dir):
+    # Imported late so they pick up OLLAMA_HOST and LLM_CACHE_PATH pointing at the stand-ins.
+    import ai_processor
+    import media_processor
+    from llm_cache import llm_cache
+
+    def reset_llm_state():
+        llm_cache.clear(); ai_processor._translation_memory.clear()
+
+    results = {}
+    def record(name, fn, reset=reset_llm_state):
+        try:
+            results[name] = time_stage(fn, args.repeat, reset)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"  {name:<40} {results[name].get('median_s', results[name].get('error'))}")
+
+    # A fresh interpreter importing what a text-only session needs: the cold-start cost of a new instance.
+    record("cold_import[app modules]", lambda: subprocess.run([sys.executable, "-c", "import ai_processor, media_processor, scoring, segment_store, tracing"],
+                                                              check=True, cwd=Path(__file__).parent), reset=None)
+    text = " ".join(random.Random(0).choices(_FILLER, k=args.text_words))
+    record("summarize_text", lambda: ai_processor.summarize_text(text, use_cache=False))
+    record("generate_platform_post", lambda: ai_processor.generate_platform_post("summary", "YouTube", "Witty, concise, emojis", use_cache=False))
+    async def all_platforms():
+        return [post async for post in ai_processor.agenerate_posts("summary", ["YouTube", "TikTok", "Twitter", "LinkedIn"], "Witty, concise, emojis", "Spanish", use_cache=False)]
+    record("agenerate_posts[4 platforms+translate]", lambda: asyncio.run(all_platforms()))
+    record(f"best_post_variant[{ai_processor.POST_VARIANTS} variants]", lambda: ai_processor.best_post_variant("post", "YouTube", "Witty, concise, emojis", "English", use_cache=False))
+
+    ffmpeg = shutil.which("ffmpeg") is not None
+    for duration in args.durations:
+        segments = make_segments(duration)
+        record(f"generate_ass_from_segments[{duration}s]", lambda: media_processor.generate_ass_from_segments(segments, "Spanish"))
+        if not ffmpeg:
+            results[f"media[{duration}s]"] = {"skipped": "ffmpeg not found"}; continue
+        video = make_media(work_dir / f"synthetic_{duration}s.mp4", duration)
+        audio = make_media(work_dir / f"synthetic_{duration}s.wav", duration, with_video=False)
+        clip_len = min(args.clip_len, duration)
+        ass_path = work_dir / f"subs_{duration}s.ass"
+        ass_path.write_text(media_processor.generate_ass_from_segments([s for s in segments if s["end"] <= clip_len], "Original")[0], encoding="utf-8")
+        raw_clip = work_dir / f"raw_{duration}s.mp4"
+        record(f"ffmpeg_cut[{duration}s]", lambda: media_processor.ffmpeg_cut(video, 0, clip_len, raw_clip), reset=None)
+        record(f"ffmpeg_burn_subtitles[{duration}s]", lambda: media_processor.ffmpeg_burn_subtitles(raw_clip, ass_path, work_dir / "burned.mp4"), reset=None)
+        record(f"ffmpeg_render_clip[{duration}s]", lambda: media_processor.ffmpeg_render_clip(video, 0, clip_len, ass_path, work_dir / "rendered.mp4"), reset=None)
+        if media_processor.whisper_installed() and _whisper_weights_cached(args.whisper_model):
+            record(f"transcribe_with_whisper[{duration}s]", lambda: media_processor.transcribe_with_whisper(audio, args.whisper_model, use_cache=False), reset=None)
+            results["whisper_import"] = {"seconds": round(media_processor.whisper_import_s, 4)}
+        else:
+            results[f"transcribe_with_whisper[{duration}s]"] = {"skipped": f"openai-whisper or cached '{args.whisper_model}' weights not available offline"}
+    return results
+
+
+def compare(current, baseline):
+    print(f"\n{'stage':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("median_s")
+        now = result.get("median_s")
+        if before is None or now is None: continue
+        print(f"{name:<40} {before:>10.4f} {now:>10.4f} {(now - before) / before * 100 if before else 0:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each pipeline stage offline against a fake Ollama server and synthetic media.")
+    parser.add_argument("--durations", default="30,120", help="comma-separated synthetic media lengths in seconds (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--clip-len", type=int, default=15)
+    parser.add_argument("--text-words", type=int, default=3000, help="length of the synthetic article to summarize")
+    parser.add_argument("--latency-ms", type=float, default=200, help="fake Ollama time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50, help="fake Ollama generation speed")
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+    args.durations = [int(d) for d in args.durations.split(",") if d.strip()]
+
+    server = FakeOllamaServer(args.latency_ms / 1000, args.tokens_per_s, args.response_tokens).start()
+    work_dir = Path(tempfile.mkdtemp(prefix="viralspark_bench_"))
+    os.environ["OLLAMA_HOST"] = server.host
+    os.environ["LLM_CACHE_PATH"] = str(work_dir / "llm_cache.sqlite3")
+    os.environ["TRANSCRIPT_CACHE_DIR"] = str(work_dir / "transcripts")
+    print(f"Fake Ollama at {server.host}; working in {work_dir}")
+    try:
+        stages = run_benchmarks(args, work_dir)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    ffmpeg_version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.split("\n", 1)[0] if shutil.which("ffmpeg") else None
+    report = {"environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(), "ffmpeg": ffmpeg_version},
+              "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+              "stages": stages}
+    Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True), encoding="utf-8")
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+import importlib.util
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from ai_processor import translate_segments
+from tracing import bind, span
+from transcript_cache import media_digest, transcript_cache, transcript_key
+
+# whisper pulls in torch, which takes seconds to import, so it is imported on the first transcription and
+# text-only sessions never pay for it. whisper_import_s records how long that import took.
+_whisper = None
+_whisper_import_lock = threading.Lock()
+whisper_import_s = None
+
+
+def whisper_installed():
+    """Whether openai-whisper can be imported, checked without importing it."""
+    return importlib.util.find_spec("whisper") is not None
+
+
+def load_whisper():
+    """Returns the whisper module, importing it (and torch) on first use."""
+    global _whisper, whisper_import_s
+    with _whisper_import_lock:
+        if _whisper is None:
+            with span("whisper.import") as import_span:
+                started = time.perf_counter()
+                try:
+                    import whisper
+                except ImportError as e:
+                    raise RuntimeError(f"Whisper not available. Install openai-whisper. ({e})") from e
+                whisper_import_s = time.perf_counter() - started
+                import_span.set(import_s=round(whisper_import_s, 3))
+            print(f"Imported whisper and torch in {whisper_import_s:.2f}s")
+            _whisper = whisper
+        return _whisper
+
+# Models are shared by every Streamlit session in this process, so the budget is process-wide.
+WHISPER_MEMORY_BUDGET_MB = int(os.environ.get("WHISPER_MEMORY_BUDGET_MB", "4096"))
+WHISPER_IDLE_TIMEOUT_S = float(os.environ.get("WHISPER_IDLE_TIMEOUT_S", "1800"))
+# Comma-separated model names to load in the background as soon as the server imports this module
+# (this also imports torch at startup, so leave it empty on instances that mostly handle text).
+WHISPER_PRELOAD_MODELS = [m.strip() for m in os.environ.get("WHISPER_PRELOAD_MODELS", "").split(",") if m.strip()]
+
+# Chunked transcription: long media is cut at quiet points and the chunks are transcribed in a process pool.
+SAMPLE_RATE = 16000
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", os.cpu_count() or 1))
+TRANSCRIBE_CHUNK_S = float(os.environ.get("TRANSCRIBE_CHUNK_S", "120"))
+CHUNK_SEARCH_S = 15.0
+CHUNK_OVERLAP_S = 1.0
+# Parameter counts (millions) of the Whisper checkpoints; each worker process holds one fp32 copy of the model.
+_WHISPER_PARAMS_M = {"tiny": 39, "base": 74, "small": 244, "medium": 769, "large": 1550, "turbo": 809}
+
+# Each clip render is an ffmpeg process that is itself multi-threaded, so run about one per two cores.
+CLIP_RENDER_WORKERS = int(os.environ.get("CLIP_RENDER_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+# x264 settings for the single-pass clip render; all profiles are CPU-only.
+RENDER_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 28},
+    "fast": {"preset": "veryfast", "crf": 23},
+    "quality": {"preset": "medium", "crf": 20},
+}
+CLIP_RENDER_PROFILE = os.environ.get("CLIP_RENDER_PROFILE", "fast")
+CLIP_RENDER_THREADS = int(os.environ.get("CLIP_RENDER_THREADS", max(1, (os.cpu_count() or 1) // CLIP_RENDER_WORKERS)))
+
+
+class _LoadedModel:
+    __slots__ = ("model", "size_bytes", "last_used", "lock")
+
+    def __init__(self, model, size_bytes):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class WhisperModelRegistry:
+    """Loads each Whisper model once per process and serializes inference on it."""
+
+    def __init__(self, memory_budget_mb=WHISPER_MEMORY_BUDGET_MB, idle_timeout_s=WHISPER_IDLE_TIMEOUT_S):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.idle_timeout_s = idle_timeout_s
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._reaper = None
+
+    def _get(self, model_name):
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is not None:
+                self._models.move_to_end(model_name)
+                return entry
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        # Only one thread loads a given model; the others wait and then reuse it.
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(model_name)
+                if entry is not None:
+                    return entry
+            # Make room first, so the incoming model never pushes the process past the budget while it loads.
+            with self._lock:
+                self._evict_locked(incoming_bytes=_model_mb(model_name) * 2**20)
+            whisper = load_whisper()
+            with span("whisper.load_model", model=model_name) as load_span:
+                model = whisper.load_model(model_name)
+                size_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+                load_span.set(size_mb=round(size_bytes / 2**20, 1))
+            entry = _LoadedModel(model, size_bytes)
+            with self._lock:
+                self._models[model_name] = entry
+                self._evict_locked(keep=model_name)
+            self._start_reaper()
+            return entry
+
+    def _start_reaper(self):
+        # Eviction otherwise only happens on use, so on a quiet server the last model would stay loaded forever.
+        with self._lock:
+            if self._reaper is not None: return
+            self._reaper = threading.Thread(target=self._reap, name="whisper-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, min(60.0, self.idle_timeout_s / 2)))
+            self.evict_idle()
+
+    def _evict_locked(self, keep=None, incoming_bytes=0):
+        now = time.monotonic()
+        for name, entry in list(self._models.items()):
+            if name != keep and not entry.lock.locked() and now - entry.last_used > self.idle_timeout_s:
+                del self._models[name]
+        total = sum(entry.size_bytes for entry in self._models.values()) + incoming_bytes
+        # Least recently used first; models busy transcribing are never dropped.
+        for name, entry in list(self._models.items()):
+            if total <= self.memory_budget_bytes: break
+            if name == keep or entry.lock.locked(): continue
+            del self._models[name]
+            total -= entry.size_bytes
+
+    @contextmanager
+    def use(self, model_name):
+        """Yields the shared model, holding its lock for the duration of the inference."""
+        entry = self._get(model_name)
+        with entry.lock:
+            entry.last_used = time.monotonic()
+            try:
+                yield entry.model
+            finally:
+                entry.last_used = time.monotonic()
+        self.evict_idle()
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_locked()
+
+    def loaded_models(self):
+        with self._lock:
+            return {name: entry.size_bytes for name, entry in self._models.items()}
+
+    def warm_up(self, model_names, background=True):
+        """Loads the given models ahead of the first transcription."""
+        def _load_all():
+            for name in model_names:
+                try:
+                    self._get(name)
+                except Exception as e:
+                    print(f"WARNING: Could not preload Whisper model '{name}': {e}")
+        if not background:
+            _load_all(); return None
+        thread = threading.Thread(target=_load_all, name="whisper-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+whisper_models = WhisperModelRegistry()
+if WHISPER_PRELOAD_MODELS and whisper_installed():
+    whisper_models.warm_up(WHISPER_PRELOAD_MODELS)
+
+
+def _run_ffmpeg(cmd, stage, **attributes):
+    """subprocess.run(cmd, check=True) with captured output, traced with its wall time and exit code."""
+    with span(f"ffmpeg.{stage}", **attributes) as ffmpeg_span:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        ffmpeg_span.set(exit_code=result.returncode)
+        if result.returncode != 0:
+            ffmpeg_span.set(stderr_tail=result.stderr.decode(errors="replace")[-500:])
+        result.check_returncode()
+        return result
+
+
+def extract_audio(media_path, sample_rate=SAMPLE_RATE):
+    """Decodes any media file to mono float32 PCM with a single ffmpeg run."""
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", str(media_path), "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-"]
+    try:
+        out = _run_ffmpeg(cmd, "extract_audio").stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='replace')}") from e
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def split_on_silence(audio, chunk_s=TRANSCRIBE_CHUNK_S, search_s=CHUNK_SEARCH_S, sample_rate=SAMPLE_RATE):
+    """Returns (start, end) sample ranges of roughly chunk_s seconds, each cut at the quietest nearby point."""
+    frame = sample_rate // 50
+    n_frames = len(audio) // frame
+    if n_frames == 0: return [(0, len(audio))]
+    energy = np.square(audio[:n_frames * frame]).reshape(n_frames, frame).mean(axis=1)
+    # Smooth over ~0.3 s so a cut lands in a pause rather than between two syllables.
+    energy = np.convolve(energy, np.ones(15) / 15, mode="same")
+    chunk_frames, search_frames = int(chunk_s * 50), int(search_s * 50)
+    cuts, pos = [0], 0
+    while n_frames - pos > chunk_frames + search_frames:
+        lo, hi = pos + chunk_frames - search_frames, pos + chunk_frames + search_frames
+        pos = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(pos)
+    bounds = [c * frame for c in cuts] + [len(audio)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _model_mb(model_name):
+    family = model_name.split(".")[0].split("-")[0]
+    return _WHISPER_PARAMS_M.get(family, _WHISPER_PARAMS_M["large"]) * 4
+
+
+class _WorkerSlots:
+    """Process-wide cap on transcription worker processes and the memory their models take.
+    Every session and batch job draws from the same slots, so concurrent transcriptions share one budget."""
+
+    def __init__(self, max_workers=TRANSCRIBE_WORKERS, memory_budget_mb=WHISPER_MEMORY_BUDGET_MB):
+        self._free_workers = max(1, max_workers)
+        self._free_mb = self._budget_mb = memory_budget_mb
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def take(self, wanted, model_mb):
+        """Grants between 1 and wanted workers, waiting while none are free."""
+        with self._cond:
+            # A model larger than the whole budget still gets one worker, but only when nothing else is running.
+            self._cond.wait_for(lambda: self._free_workers > 0 and (self._free_mb >= model_mb or self._free_mb == self._budget_mb))
+            granted = max(1, min(wanted, self._free_workers, self._free_mb // model_mb))
+            self._free_workers -= granted; self._free_mb -= granted * model_mb
+        try:
+            yield granted
+        finally:
+            with self._cond:
+                self._free_workers += granted; self._free_mb += granted * model_mb
+                self._cond.notify_all()
+
+
+_worker_slots = _WorkerSlots()
+
+
+def _init_transcribe_worker(model_name, torch_threads):
+    import torch
+    torch.set_num_threads(torch_threads)
+    whisper_models.warm_up([model_name], background=False)
+
+
+def _transcribe_chunk(audio, offset_s, keep_from_s, keep_to_s, model_name, options):
+    with whisper_models.use(model_name) as model:
+        result = model.transcribe(audio, **options)
+    segments = []
+    for seg in result.get("segments", []):
+        start, end = seg["start"] + offset_s, seg["end"] + offset_s
+        # Segments from the overlap padding belong to the neighbouring chunk.
+        if keep_from_s <= (start + end) / 2 < keep_to_s:
+            segments.append({"start": start, "end": end, "text": seg["text"]})
+    return segments
+
+
+def transcribe_chunked(audio, model_name="base", options=None, workers=TRANSCRIBE_WORKERS):
+    """Transcribes silence-split chunks of audio in parallel and merges them on the original timeline.
+    workers is an upper bound: the process-wide worker slots and the Whisper memory budget may grant fewer."""
+    options = options or {"fp16": False}
+    ranges = split_on_silence(audio)
+    overlap = int(CHUNK_OVERLAP_S * SAMPLE_RATE)
+    chunks = []
+    for start, end in ranges:
+        lo, hi = max(0, start - overlap), min(len(audio), end + overlap)
+        chunks.append((audio[lo:hi], lo / SAMPLE_RATE, start / SAMPLE_RATE, end / SAMPLE_RATE if end < len(audio) else float("inf"), model_name, options))
+    with _worker_slots.take(max(1, min(workers, len(ranges))), _model_mb(model_name)) as granted:
+        if granted == 1:
+            # No room for extra model copies: transcribe the chunks here with the shared registry model.
+            results = [_transcribe_chunk(*chunk) for chunk in chunks]
+        else:
+            # Spawn, not fork: the Streamlit server is multi-threaded and torch is not fork-safe.
+            ctx = multiprocessing.get_context("spawn")
+            torch_threads = max(1, (os.cpu_count() or 1) // granted)
+            with ProcessPoolExecutor(max_workers=granted, mp_context=ctx, initializer=_init_transcribe_worker, initargs=(model_name, torch_threads)) as pool:
+                results = list(pool.map(_transcribe_chunk, *zip(*chunks)))
+    merged = []
+    for chunk_segments in results:
+        for seg in chunk_segments:
+            prev = merged[-1] if merged else None
+            if prev and seg["text"].strip() == prev["text"].strip() and seg["start"] < prev["end"]:
+                continue
+            if prev and seg["start"] < prev["end"]:
+                # Overlap padding can repeat a segment that ends inside the previous one; trimming it would invert it.
+                if seg["end"] <= prev["end"]: continue
+                seg["start"] = prev["end"]
+            merged.append(seg)
+    for i, seg in enumerate(merged):
+        seg["id"] = i
+    return merged
+
+
+def transcribe_with_whisper(video_path, model_name="base", use_cache=True, workers=TRANSCRIBE_WORKERS, media_hash=None):
+    options = {"fp16": False}
+    with span("whisper.transcribe", model=model_name) as whisper_span:
+        # Serial and chunked runs share a cache entry; either is a valid transcript of the same media.
+        if use_cache:
+            key = transcript_key(media_hash or media_digest(video_path), model_name, options)
+            cached = transcript_cache.get(key)
+            whisper_span.set(cache_hit=cached is not None)
+            if cached is not None: return cached
+        if not whisper_installed(): raise RuntimeError("Whisper not available. Install openai-whisper.")
+        audio = extract_audio(video_path)
+        whisper_span.set(audio_s=round(len(audio) / SAMPLE_RATE, 2))
+        if workers > 1 and len(audio) > 2 * TRANSCRIBE_CHUNK_S * SAMPLE_RATE:
+            segments = transcribe_chunked(audio, model_name, options, workers)
+            text = "".join(seg["text"] for seg in segments)
+            whisper_span.set(mode="chunked", workers=workers)
+        else:
+            with whisper_models.use(model_name) as model:
+                result = model.transcribe(audio, **options)
+            segments, text = result.get("segments", []), result.get("text", "")
+            whisper_span.set(mode="serial")
+        whisper_span.set(segments=len(segments))
+        if use_cache:
+            transcript_cache.put(key, segments, text)
+        return segments, text
+
+
+# ---------- Clip rendering ----------
+def ffmpeg_cut(input_path, start_s, duration_s, out_path):
+    cmd = ["ffmpeg", "-y", "-ss", str(start_s), "-i", str(input_path), "-t", str(duration_s), "-c", "copy", str(out_path)]
+    try:
+        _run_ffmpeg(cmd, "cut")
+        return True
+    except subprocess.CalledProcessError:
+        cmd2 = ["ffmpeg", "-y", "-ss", str(start_s), "-i", str(input_path), "-t", str(duration_s), "-c:v", "libx264", "-c:a", "aac", "-preset", "veryfast", str(out_path)]
+        _run_ffmpeg(cmd2, "cut", fallback=True)
+        return True
+
+def ffmpeg_burn_subtitles(input_clip_path, ass_path, output_clip_path):
+    """Burns subtitles from a styled .ass file onto a video clip."""
+    safe_ass_path = str(ass_path).replace('\\', '/').replace(':', '\\:')
+    vf_string = f"subtitles=filename='{safe_ass_path}'"
+    cmd = ["ffmpeg", "-y", "-i", str(input_clip_path), "-vf", vf_string, "-c:a", "copy", str(output_clip_path)]
+    try:
+        _run_ffmpeg(cmd, "burn_subtitles")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Audio copy failed, trying re-encode. Error: {e.stderr.decode()}")
+        cmd2 = ["ffmpeg", "-y", "-i", str(input_clip_path), "-vf", vf_string, "-c:a", "aac", str(output_clip_path)]
+        try:
+            _run_ffmpeg(cmd2, "burn_subtitles", fallback=True)
+            return True
+        except subprocess.CalledProcessError as e2:
+            print(f"Error burning subtitles (fallback attempt): {e2.stderr.decode()}")
+            return False
+
+def ffmpeg_render_clip(input_path, start_s, duration_s, ass_path, output_clip_path, profile=CLIP_RENDER_PROFILE, threads=CLIP_RENDER_THREADS):
+    """Seeks, trims, burns the .ass subtitles and encodes in one ffmpeg run (one decode, one encode)."""
+    settings = RENDER_PROFILES[profile]
+    safe_ass_path = str(ass_path).replace('\\', '/').replace(':', '\\:')
+    # -ss before -i seeks accurately when re-encoding and restarts timestamps at 0, matching the clip-relative .ass times.
+    cmd = ["ffmpeg", "-y", "-ss", str(start_s), "-i", str(input_path), "-t", str(duration_s),
+           "-vf", f"subtitles=filename='{safe_ass_path}'", "-c:v", "libx264", "-preset", settings["preset"], "-crf", str(settings["crf"]),
+           "-threads", str(threads), "-c:a", "aac", "-movflags", "+faststart", str(output_clip_path)]
+    try:
+        _run_ffmpeg(cmd, "render_clip", profile=profile, threads=threads, duration_s=duration_s)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Error rendering clip: {e.stderr.decode()}")
+        return False
+
+def generate_ass_from_segments(segments, target_language="English"):
+    """Generates a styled .ass subtitle file string from timed segments."""
+    font_file_path = os.path.join(os.getcwd(), 'fonts', 'Roboto-Regular.ttf').replace('\\', '/')
+    Path(os.path.dirname(font_file_path)).mkdir(parents=True, exist_ok=True)
+    if not Path(font_file_path).exists():
+        print(f"WARNING: Font file not found at {font_file_path}. Subtitles might not render correctly.")
+    ass_header = f"""[Script Info]
+Title: Generated Subtitles
+ScriptType: v4.00+
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+YCbCr Matrix: None
+PlayResX: 1280
+PlayResY: 720
+Font: {font_file_path}
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Roboto Regular,22,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,1.5,1,2,10,10,25,1
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+    ass_dialogue = ""
+    full_translated_text = []
+    texts = [seg.get("text", "").strip() for seg in segments]
+    # One batched pass for every segment; repeated segments come from the translation memory.
+    translations = translate_segments(texts, target_language) if target_language != "Original" else texts
+    for seg, translated_text in zip(segments, translations):
+        start_time = seg.get("start", 0)
+        end_time = seg.get("end", 0)
+        start_ass = f"{int(start_time//3600)}:{int((start_time%3600)//60):02}:{int(start_time%60):02}.{int((start_time*100)%100):02}"
+        end_ass = f"{int(end_time//3600)}:{int((end_time%3600)//60):02}:{int(end_time%60):02}.{int((end_time*100)%100):02}"
+        full_translated_text.append(translated_text)
+        cleaned_text = translated_text.replace('\n', '\\N').replace('{', '\\{').replace('}', '\\}')
+        ass_dialogue += f"Dialogue: 0,{start_ass},{end_ass},Default,,0,0,0,,{cleaned_text}\n"
+    return ass_header + ass_dialogue, " ".join(full_translated_text)
+
+def render_clip(video_path, clip_index, start_time, duration, target_language, clip_segments, out_dir):
+    """Writes the clip's subtitles and renders the subtitled clip. Returns (clip path, subtitle text)."""
+    out_dir = Path(out_dir)
+    ass_path = out_dir / f"subs_{clip_index+1}.ass"
+    final_clip_path = out_dir / f"final_clip_{clip_index+1}.mp4"
+    adjusted_segments = []
+    for seg in clip_segments:
+        new_start = max(0, seg['start'] - start_time)
+        new_end = min(duration, seg['end'] - start_time)
+        if new_start < new_end:
+            adjusted_segments.append({'start': new_start, 'end': new_end, 'text': seg['text']})
+    ass_content, final_translated_text = generate_ass_from_segments(adjusted_segments, target_language)
+    with open(ass_path, "w", encoding="utf-8") as ass_file:
+        ass_file.write(ass_content)
+    if not ffmpeg_render_clip(video_path, start_time, duration, ass_path, final_clip_path):
+        raise RuntimeError(f"Could not render clip {clip_index+1}")
+    return final_clip_path, final_translated_text
+
+
+def render_clips(video_path, clips, target_language, out_dir, max_workers=CLIP_RENDER_WORKERS):
+    """Renders (clip_index, start_time, duration, clip_segments) jobs on a bounded worker pool.
+    Yields (clip_index, clip_path, subtitle_text, error) in completion order."""
+    if target_language != "Original":
+        # Translate every clip's lines in one batched pass up front; the workers then hit the translation memory.
+        translate_segments([seg['text'].strip() for _, _, _, segs in clips for seg in segs], target_language)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(clips)))) as pool:
+        futures = {pool.submit(bind(render_clip), video_path, i, start, duration, target_language, segs, out_dir): i for i, start, duration, segs in clips}
+        for future in as_completed(futures):
+            try:
+                clip_path, text = future.result()
+                yield futures[future], clip_path, text, None
+            except Exception as e:
+                yield futures[future], None, None, e
@@ -0,0 +1,102 @@
+import functools
+import math
+import re
+
+import numpy as np
+
+from segment_store import SegmentStore
+
+ENGAGEMENT_EMOJIS = "😀😁😂🤣😍🔥✨💡🎯👍🙌"
+CALL_TO_ACTION_WORDS = ["subscribe", "follow", "comment", "share", "link in bio", "join"]
+
+_DROP_EMOJIS = str.maketrans("", "", ENGAGEMENT_EMOJIS)
+
+def heuristics_engagement_scores(posts):
+    """heuristics_engagement_score for many posts at once, as an int array."""
+    posts = list(posts)
+    lengths = np.fromiter((len(p) for p in posts), dtype=np.int64, count=len(posts))
+    # str.translate and str.count run in C, so no per-character Python loop is needed.
+    emojis = lengths - np.fromiter((len(p.translate(_DROP_EMOJIS)) for p in posts), dtype=np.int64, count=len(posts))
+    tags = np.fromiter((p.count("#") for p in posts), dtype=np.int64, count=len(posts))
+    lowered = [p.lower() for p in posts]
+    calls_to_action = np.fromiter((sum(w in p for w in CALL_TO_ACTION_WORDS) for p in lowered), dtype=np.int64, count=len(posts))
+    scores = 50 + np.select([lengths < 40, lengths < 200], [5, 10], -5)
+    scores += np.minimum(10, emojis * 4) + np.minimum(10, tags * 3) + 4 * calls_to_action
+    return np.clip(scores, 0, 100)
+
+def heuristics_engagement_score(post_text):
+    return int(heuristics_engagement_scores([post_text])[0])
+
+# ---------- Highlight detection ----------
+
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+_STOPWORDS = frozenset("""a an and are as at be been but by can could did do does for from had has have he her his i if in into is it its
+just like me my not of on or our she so than that the their them then there these they this to too was we were what when which who will
+with would you your yeah okay um uh really very going get got know think""".split())
+_HOOK_WORDS = frozenset("how why what secret mistake never always best worst truth nobody everyone imagine stop"
+                        " actually biggest first last only problem".split())
+# Relative weight of each standardized window feature in the final highlight score.
+HIGHLIGHT_WEIGHTS = {"keywords": 1.0, "speech_rate": 0.6, "hook": 0.8, "lead_pause": 0.4, "dead_air": -0.8}
+
+
+def _zscore(values):
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+
+@functools.lru_cache(maxsize=8)
+def _segment_features(texts, summary):
+    """Per-segment word counts, summary-keyword TF-IDF mass and hook strength (cached across reruns)."""
+    words = [[w.lower() for w in _WORD.findall(t)] for t in texts]
+    keywords = {w for w in (w.lower() for w in _WORD.findall(summary)) if len(w) > 2 and w not in _STOPWORDS}
+    document_freq = {}
+    for seg_words in words:
+        for w in set(seg_words) & keywords:
+            document_freq[w] = document_freq.get(w, 0) + 1
+    n_docs = max(1, len(texts))
+    idf = {w: math.log((1 + n_docs) / (1 + df)) + 1 for w, df in document_freq.items()}
+    word_counts = np.fromiter((len(w) for w in words), dtype=np.float64, count=len(words))
+    keyword_mass = np.fromiter((sum(idf.get(w, 0.0) for w in seg_words) for seg_words in words), dtype=np.float64, count=len(words))
+    hooks = np.fromiter((1.5 * t.count("?") + 0.5 * t.count("!") + sum(w in _HOOK_WORDS for w in seg_words) + any(w.isdigit() for w in seg_words)
+                         for t, seg_words in zip(texts, words)), dtype=np.float64, count=len(words))
+    return word_counts, keyword_mass, hooks
+
+
+def rank_highlights(segments, clip_len, num_clips, summary=""):
+    """Scores a clip_len window starting at every segment and returns the best num_clips non-overlapping ones.
+    Each result is {"start", "end", "score"}; results are ordered best first."""
+    store = segments if isinstance(segments, SegmentStore) else SegmentStore(segments)
+    n = len(store)
+    if n == 0 or clip_len <= 0 or num_clips <= 0: return []
+    starts, ends = store.starts, store.ends
+    word_counts, keyword_mass, hooks = _segment_features(store.texts, summary)
+    gaps = np.clip(np.diff(starts) - (ends[:-1] - starts[:-1]), 0, None)
+    lead_pause = np.concatenate(([starts[0]], gaps))
+
+    # Window i covers segments [i, stop[i]); prefix sums turn every window aggregate into one subtraction.
+    stop = np.searchsorted(starts, starts + clip_len, side="left")
+    def window_sum(values):
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        return prefix[stop] - prefix[np.arange(n)]
+    words = window_sum(word_counts)
+    inner_gaps = window_sum(np.concatenate((gaps, [0.0]))) - np.concatenate((gaps, [0.0]))[stop - 1]
+    features = {
+        "keywords": window_sum(keyword_mass) / np.maximum(words, 1.0),
+        "speech_rate": words / clip_len,
+        # A hook in the opening line counts double: it is what stops the scroll.
+        "hook": window_sum(hooks) + hooks,
+        "lead_pause": np.minimum(lead_pause, 2.0),
+        "dead_air": np.clip(inner_gaps, 0, None) / clip_len,
+    }
+    scores = sum(weight * _zscore(features[name]) for name, weight in HIGHLIGHT_WEIGHTS.items())
+    # Windows running past the end of the media cannot be cut at full length.
+    fits = starts + clip_len <= ends.max() + 1.0
+    scores = np.where(fits | ~fits.any(), scores, -np.inf)
+
+    picked = []
+    available = np.isfinite(scores)
+    while len(picked) < num_clips and available.any():
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        picked.append({"start": float(starts[best]), "end": float(starts[best] + clip_len), "score": float(scores[best])})
+        available &= np.abs(starts - starts[best]) >= clip_len
+    return picked
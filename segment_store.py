@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class SegmentStore:
+    """Array-backed transcript segments: start/end arrays plus a text table, ordered by start time.
+    Only start, end and text are kept; Whisper's tokens, logprobs etc. are dropped."""
+
+    __slots__ = ("starts", "ends", "texts", "_max_end")
+
+    def __init__(self, segments=()):
+        rows = sorted((float(s["start"]), float(s["end"]), s.get("text", "")) for s in segments)
+        self.starts = np.array([r[0] for r in rows], dtype=np.float64)
+        self.ends = np.array([r[1] for r in rows], dtype=np.float64)
+        self.texts = tuple(r[2] for r in rows)
+        # Running maximum of end times: monotonic even if segments overlap, so it can be binary-searched.
+        self._max_end = np.maximum.accumulate(self.ends) if rows else self.ends
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _segment(self, i):
+        return {"start": float(self.starts[i]), "end": float(self.ends[i]), "text": self.texts[i]}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._segment(i) for i in range(*index.indices(len(self)))]
+        return self._segment(range(len(self))[index])
+
+    def __iter__(self):
+        return (self._segment(i) for i in range(len(self)))
+
+    def overlapping_indices(self, start, end):
+        """Indices of segments with seg.start < end and seg.end > start, found by binary search."""
+        hi = int(np.searchsorted(self.starts, end, side="left"))
+        lo = int(np.searchsorted(self._max_end, start, side="right"))
+        if lo >= hi: return np.empty(0, dtype=np.intp)
+        return lo + np.flatnonzero(self.ends[lo:hi] > start)
+
+    def overlapping(self, start, end):
+        return [self._segment(i) for i in self.overlapping_indices(start, end)]
@@ -0,0 +1,142 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("viralspark_trace", default=None)
+_current_span = contextvars.ContextVar("viralspark_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name, parent_id=None, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    @property
+    def duration_s(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {"name": self.name, "span_id": self.span_id, "parent_id": self.parent_id, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_s": round(self.duration_s, 6), "status": self.status, "attributes": self.attributes}
+
+
+class Trace:
+    """Spans recorded for one job: one analyzed upload in the app, or one batch_cli job."""
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """One row per span name (per prompt template for Ollama calls): call count, wall time, errors, token counts and cache hits."""
+        rows = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = f"{span.name}[{span.attributes['template']}]" if "template" in span.attributes else span.name
+            row = rows.setdefault(stage, {"stage": stage, "calls": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0,
+                                              "prompt_tokens": 0, "output_tokens": 0, "cache_hits": 0})
+            row["calls"] += 1
+            row["total_s"] += span.duration_s
+            row["max_s"] = max(row["max_s"], span.duration_s)
+            row["errors"] += span.status == "error"
+            row["prompt_tokens"] += span.attributes.get("prompt_eval_count") or 0
+            row["output_tokens"] += span.attributes.get("eval_count") or 0
+            row["cache_hits"] += bool(span.attributes.get("cache_hit"))
+        for row in rows.values():
+            row["total_s"] = round(row["total_s"], 3); row["max_s"] = round(row["max_s"], 3)
+        return sorted(rows.values(), key=lambda r: -r["total_s"])
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({"trace_id": self.trace_id, "name": self.name, "spans": [s.to_dict() for s in self.spans]}, indent=2, default=str)
+
+    def to_otlp_json(self):
+        """The spans in OpenTelemetry's OTLP/JSON layout, ready for a collector's /v1/traces endpoint."""
+        def attribute(key, value):
+            if isinstance(value, bool): return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int): return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float): return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+        with self._lock:
+            spans = [{"traceId": self.trace_id, "spanId": s.span_id, "parentSpanId": s.parent_id or "", "name": s.name, "kind": 1,
+                      "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                      "attributes": [attribute(k, v) for k, v in s.attributes.items()],
+                      "status": {"code": 1 if s.status == "ok" else 2}} for s in self.spans]
+        return json.dumps({"resourceSpans": [{"resource": {"attributes": [attribute("service.name", "viralspark"), attribute("trace.name", self.name)]},
+                                              "scopeSpans": [{"scope": {"name": "viralspark"}, "spans": spans}]}]}, indent=2)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times the enclosed block as a span of the current trace. Outside a trace the span is timed but not kept."""
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, {k: v for k, v in attributes.items() if v is not None})
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"; current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        trace = _current_trace.get()
+        if trace is not None: trace.add(current)
+
+
+def finish_span(span, status="ok"):
+    """Ends a span created directly (for work that yields, where a context manager would leak into the caller)."""
+    span.end_ns = time.time_ns(); span.status = status
+    trace = _current_trace.get()
+    if trace is not None: trace.add(span)
+
+
+def current_span_id():
+    current = _current_span.get()
+    return current.span_id if current else None
+
+
+def set_trace(trace):
+    """Makes trace the current trace for this thread's context (and anything it starts with bind or asyncio)."""
+    return _current_trace.set(trace)
+
+
+@contextmanager
+def use_trace(trace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def bind(fn):
+    """Wraps fn so it runs in a copy of the caller's context; thread pools do not propagate context on their own."""
+    context = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+TRANSCRIPT_CACHE_DIR = Path(os.environ.get("TRANSCRIPT_CACHE_DIR", Path.home() / ".cache" / "viralspark" / "transcripts"))
+TRANSCRIPT_CACHE_MAX_MB = int(os.environ.get("TRANSCRIPT_CACHE_MAX_MB", "512"))
+CACHE_FORMAT_VERSION = 1
+_READ_CHUNK = 1024 * 1024
+
+
+def media_digest(path):
+    """Hashes a media file in fixed-size chunks so large uploads never sit in memory."""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        while chunk := f.read(_READ_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def spool_with_digest(src, dst):
+    """Copies an open file object to dst chunk by chunk and returns the media_digest of the bytes copied."""
+    h = hashlib.blake2b(digest_size=32)
+    while chunk := src.read(_READ_CHUNK):
+        h.update(chunk)
+        dst.write(chunk)
+    return h.hexdigest()
+
+
+def transcript_key(media_hash, model_name, options=None):
+    payload = json.dumps({"v": CACHE_FORMAT_VERSION, "media": media_hash, "model": model_name, "options": options or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """On-disk transcript store with size-bounded LRU eviction (file mtime is the recency stamp)."""
+
+    def __init__(self, cache_dir=TRANSCRIPT_CACHE_DIR, max_mb=TRANSCRIPT_CACHE_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json.gz"
+
+    def get(self, key):
+        """Returns (segments, text) for a cached transcript, or None."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            data = None
+        except (OSError, ValueError):
+            # Truncated or corrupt entry: drop it and transcribe again.
+            path.unlink(missing_ok=True); data = None
+        with self._lock:
+            if data is None: self.misses += 1; return None
+            self.hits += 1
+        segments = [{"id": i, "start": s, "end": e, "text": t} for i, (s, e, t) in enumerate(data["segments"])]
+        return segments, data["text"]
+
+    def put(self, key, segments, text):
+        # Only the fields the app reads are kept; Whisper's tokens/logprobs are dropped.
+        data = {"text": text, "segments": [[round(float(s["start"]), 3), round(float(s["end"]), 3), s["text"]] for s in segments]}
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.json.gz"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes: break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(entries), "bytes": sum(size for _, size, _ in entries)}
+
+
+transcript_cache = TranscriptCache()